@@ -0,0 +1,103 @@
+"""Benchmark: MusicQueue operations over a 10k-entry queue.
+
+Compares the deque-backed cogs.music.MusicQueue with a plain list-based queue (pop(0) on every get,
+slicing for pages) for the operations the cog performs. MusicQueue also keeps video id counts and a
+version number, which the list queue does not, so it pays for those on every put, remove and get.
+
+Usage: python benchmarks/music_queue.py [entries]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.music import MusicQueue, Track
+
+
+class ListQueue:
+    """A list-based queue written the obvious way."""
+
+    def __init__(self):
+        self._queue = []
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        async with self._lock:
+            if not self._queue:
+                return None
+            return self._queue.pop(0)
+
+    async def put(self, item):
+        async with self._lock:
+            self._queue.append(item)
+
+    async def remove(self, index):
+        async with self._lock:
+            if 0 <= index < len(self._queue):
+                return self._queue.pop(index)
+            return None
+
+    def page(self, page, per_page=10):
+        return self._queue[page * per_page:(page + 1) * per_page]
+
+
+def make_tracks(count):
+    return [Track(f"id{i:07d}", f"Song {i}", f"https://www.youtube.com/watch?v=id{i:07d}") for i in range(count)]
+
+
+async def timed(label, coro_factory, results):
+    started = time.perf_counter()
+    await coro_factory()
+    results.setdefault(label, []).append(time.perf_counter() - started)
+
+
+async def exercise(queue, tracks, results):
+    async def fill():
+        for track in tracks:
+            await queue.put(track)
+
+    async def pages():
+        for page in range(0, len(tracks) // 10, 25):
+            queue.page(page)
+
+    async def removals():
+        rng = random.Random(0)
+        for _ in range(1000):
+            await queue.remove(rng.randrange(len(tracks) // 2))
+
+    async def drain():
+        while await queue.get() is not None:
+            pass
+
+    await timed("put x N", fill, results)
+    await timed("page every 25th page", pages, results)
+    await timed("remove x 1000 (random index)", removals, results)
+    await timed("get until empty", drain, results)
+
+
+async def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    tracks = make_tracks(entries)
+    timings = {}
+    for name, queue in (("list", ListQueue()), ("deque", MusicQueue())):
+        results = {}
+        await exercise(queue, tracks, results)
+        timings[name] = results
+
+    print(f"{entries} entries")
+    for label in timings["list"]:
+        before, after = timings["list"][label][0], timings["deque"][label][0]
+        print(f"{label:<30} list {before * 1000:9.2f}ms   deque {after * 1000:9.2f}ms   ({before / after:6.1f}x)")
+
+    queue = MusicQueue()
+    await queue.extend(tracks + tracks[: entries // 10])
+    started = time.perf_counter()
+    dropped = await queue.dedupe()
+    print(f"dedupe of {len(tracks) + entries // 10} entries dropped {dropped} in {(time.perf_counter() - started) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
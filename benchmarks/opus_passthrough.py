@@ -0,0 +1,54 @@
+"""Benchmark: CPU per stream for each way a track can reach Discord.
+
+Generates an Ogg/Opus test file, then plays it as fast as ffmpeg can through the same options
+YTDLOpusSource and the PCM path use, and reports CPU time as a share of one core per realtime stream.
+The PCM path's libopus encode happens in the bot process; it is measured here as a separate ffmpeg
+encode of the decoded PCM, which runs the same library.
+
+Usage: python benchmarks/opus_passthrough.py [seconds of audio] [ffmpeg executable]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+OPUS_OUTPUT = ['-map_metadata', '-1', '-f', 'opus', '-ar', '48000', '-ac', '2', '-b:a', '128k', 'pipe:1']
+PCM_OUTPUT = ['-f', 's16le', '-ar', '48000', '-ac', '2', 'pipe:1']
+
+
+def cpu_seconds(ffmpeg, args, stdin=None):
+    """Runs ffmpeg and returns (CPU seconds it used, its output)."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', *args], input=stdin, stdout=subprocess.PIPE, check=True)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime), result.stdout
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    ffmpeg = sys.argv[2] if len(sys.argv) > 2 else 'ffmpeg'
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'test.ogg')
+        cpu_seconds(ffmpeg, [
+            '-f', 'lavfi', '-i', f'anoisesrc=d={seconds}:c=pink:a=0.2', '-f', 'lavfi', '-i', f'sine=f=440:d={seconds}',
+            '-filter_complex', '[0][1]amix,aformat=channel_layouts=stereo', '-ar', '48000', '-c:a', 'libopus', '-b:a', '128k', path,
+        ])
+
+        copy, _ = cpu_seconds(ffmpeg, ['-i', path, '-vn', '-c:a', 'copy', *OPUS_OUTPUT])
+        filtered, _ = cpu_seconds(ffmpeg, ['-i', path, '-vn', '-af', 'volume=0.50', '-c:a', 'libopus', *OPUS_OUTPUT])
+        decode, pcm = cpu_seconds(ffmpeg, ['-i', path, '-vn', *PCM_OUTPUT])
+        encode, _ = cpu_seconds(ffmpeg, ['-f', 's16le', '-ar', '48000', '-ac', '2', '-i', 'pipe:0', '-c:a', 'libopus', *OPUS_OUTPUT], stdin=pcm)
+
+    results = [
+        ("Opus passthrough, 100% (stream copy)", copy),
+        ("Opus passthrough, other volume (ffmpeg filter)", filtered),
+        ("PCM path (ffmpeg decode + libopus encode)", decode + encode),
+    ]
+    for name, cpu in results:
+        print(f"{name:<48} {cpu / seconds * 100:>6.2f}% of a core per stream")
+
+
+if __name__ == "__main__":
+    main()
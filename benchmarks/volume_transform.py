@@ -0,0 +1,61 @@
+"""Micro-benchmark: PCM frames/sec through the volume stage.
+
+Compares utils.audio.NumpyVolumeTransformer against discord.PCMVolumeTransformer (audioop)
+for a steady volume, a volume ramp and a crossfade. The player needs 50 frames/sec per guild.
+
+Usage: python benchmarks/volume_transform.py [frames]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+import numpy as np
+
+from utils.audio import FRAME_SIZE, NumpyVolumeTransformer
+
+
+class NoiseSource(discord.AudioSource):
+    """Endless source returning the same frame of random PCM."""
+
+    def __init__(self):
+        self.frame = np.random.default_rng(0).integers(-20000, 20000, FRAME_SIZE // 2, dtype=np.int16).tobytes()
+
+    def read(self):
+        return self.frame
+
+
+def run(source, frames, before_read=None):
+    started = time.perf_counter()
+    for index in range(frames):
+        if before_read:
+            before_read(source, index)
+        source.read()
+    return frames / (time.perf_counter() - started)
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    def keep_ramping(source, index):
+        if index % 20 == 0: # A new volume target every 20 frames keeps the ramp path busy
+            source.volume = 0.3 if source.volume > 0.5 else 0.9
+
+    def keep_fading(source, index):
+        if index % 200 == 0:
+            source.crossfade_from(NumpyVolumeTransformer(NoiseSource(), 0.8), 150)
+
+    results = [
+        ("PCMVolumeTransformer, steady", run(discord.PCMVolumeTransformer(NoiseSource(), 0.7), frames)),
+        ("NumpyVolumeTransformer, steady", run(NumpyVolumeTransformer(NoiseSource(), 0.7), frames)),
+        ("NumpyVolumeTransformer, ramping", run(NumpyVolumeTransformer(NoiseSource(), 0.7), frames, keep_ramping)),
+        ("NumpyVolumeTransformer, crossfading", run(NumpyVolumeTransformer(NoiseSource(), 0.7), frames, keep_fading)),
+    ]
+    for name, rate in results:
+        print(f"{name:<38} {rate:>10,.0f} frames/s  ({rate / 50:,.0f} realtime streams)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
-import discord
-from discord.ext import commands
 import os
 import asyncio
 import json # For loading config.json
 import sys # For exiting gracefully
+import time
+
+# Only the standard library and definitions at module level: with YTDL_PROCESS_POOL, every spawned
+# extraction worker re-imports this file as __mp_main__. The bot itself is built under __name__ == "__main__".
+
+STARTED_AT = time.perf_counter() # For the time-to-ready report
+PROFILE_STARTUP = "--profile-startup" in sys.argv # Load every cog, print the startup profile as JSON and exit
 
 # --- Configuration Loading ---
 CONFIG_FILE = "config.json"
@@ -12,7 +17,7 @@ DEFAULT_CONFIG = {
     "PREFIX": "!"
 }
 
-def load_config():
+def load_config(require_token=True):
     if not os.path.exists(CONFIG_FILE):
         print(f"Error: Configuration file '{CONFIG_FILE}' not found.")
         print(f"Please create it with the following structure:\n{json.dumps(DEFAULT_CONFIG, indent=2)}")
@@ -30,7 +35,7 @@ def load_config():
         sys.exit(1)
 
     # Validate critical keys
-    if not config.get("BOT_TOKEN") or config["BOT_TOKEN"] == DEFAULT_CONFIG["BOT_TOKEN"]:
+    if require_token and (not config.get("BOT_TOKEN") or config["BOT_TOKEN"] == DEFAULT_CONFIG["BOT_TOKEN"]):
         print(f"Error: 'BOT_TOKEN' is missing or not set in '{CONFIG_FILE}'.")
         print("Please add your bot token to the configuration file.")
         sys.exit(1)
@@ -41,54 +46,82 @@ def load_config():
 
     return config
 
-config_data = load_config()
 # --- End Configuration Loading ---
 
 
-# Define intents
-intents = discord.Intents.default()
-intents.message_content = True # Enable message content intent if needed for your bot
-intents.guilds = True # Explicitly enable guilds intent
+def create_bot(config_data, *, profiling=False):
+    """Creates the bot along with its cog loader (bot.cog_loader) and command syncer (bot.command_syncer).
+    With `profiling`, cogs skip their side effects (disk state, background tasks, git), see bot.profiling.
+    """
+    import discord
+    from discord.ext import commands
+    from utils.cogloader import CogLoader
+    from utils.commandsync import CommandSyncer
+
+    # Define intents
+    intents = discord.Intents.default()
+    intents.message_content = True # Enable message content intent if needed for your bot
+    intents.guilds = True # Explicitly enable guilds intent
+
+    # Create an instance of the bot
+    bot = commands.Bot(command_prefix=config_data["PREFIX"], intents=intents)
+    bot.config = config_data # Lets cogs read their optional settings
+    bot.startup_reported = False
+    bot.profiling = profiling # --profile-startup: load cogs as if for real, but leave no trace
+    bot.cog_loader = CogLoader(bot)
+    # Syncs only when the commands changed; DEV_GUILD_IDS syncs to those guilds instead of globally
+    bot.command_syncer = CommandSyncer(bot.tree, dev_guild_ids=config_data.get("DEV_GUILD_IDS", []))
+
+    @bot.event
+    async def on_ready():
+        print(f'{bot.user.name} has connected to Discord!')
+        if not bot.startup_reported: # on_ready fires again after reconnects
+            bot.startup_reported = True
+            print(f"Ready {time.perf_counter() - STARTED_AT:.2f}s after start.")
+        await bot.cog_loader.wait_lazy() # Lazy cogs' slash commands have to be in the tree before it is synced
+        # Sync application commands, if they changed since the last sync
+        try:
+            synced = await bot.command_syncer.sync()
+            if synced:
+                print("Synced commands: " + ", ".join(f"{count} ({scope})" for scope, count in synced.items()))
+            else:
+                print("Application commands unchanged, skipped sync.")
+        except Exception as e:
+            print(f"Failed to sync commands: {e}")
 
-# Create an instance of the bot
-bot = commands.Bot(command_prefix=config_data["PREFIX"], intents=intents)
-tree = bot.tree # Added for slash commands
+    return bot
 
-@bot.event
-async def on_ready():
-    print(f'{bot.user.name} has connected to Discord!')
-    # Sync application commands
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} commands")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
-
-async def load_all_cogs():
-    """Loads all cogs from the cogs directory."""
+async def load_all_cogs(bot):
+    """Loads the eager cogs from the cogs directory, concurrently where their dependencies allow.
+    Lazy cogs (COG_META = {'lazy': True}) start loading in the background once this returns.
+    """
     print("Loading cogs...")
     # Ensure cogs directory exists
     if not os.path.isdir('./cogs'):
         print("Warning: 'cogs' directory not found. No cogs will be loaded.")
         return
 
-    for filename in os.listdir('./cogs'):
-        if filename.endswith('.py') and filename != '__init__.py':
-            try:
-                await bot.load_extension(f'cogs.{filename[:-3]}')
-                print(f'Successfully loaded cog: {filename[:-3]}')
-            except commands.ExtensionNotFound:
-                 print(f'Cog not found: {filename[:-3]}. Skipping.')
-            except commands.NoEntryPointError:
-                print(f'Cog {filename[:-3]} does not have a setup function. Skipping.')
-            except commands.ExtensionFailed as e:
-                print(f'Failed to load cog: {filename[:-3]}. Error: {e.original}') # Access original error
-            except Exception as e:
-                print(f'An unexpected error occurred loading cog: {filename[:-3]}. Error: {e}')
-    print("Cog loading complete.")
-
-async def main():
+    bot.cog_loader.discover()
+    await bot.cog_loader.load_eager()
+    failed = bot.cog_loader.failures()
+    print(f"Cog loading complete in {bot.cog_loader.phases['eager'] * 1000:.0f} ms" + (f" ({len(failed)} failed)." if failed else "."))
+
+async def profile_startup(bot):
+    """Loads every cog, lazy ones included, without connecting and prints the startup profile.
+    Returns the process exit code: 1 if any cog failed to load.
+    """
+    await load_all_cogs(bot)
+    await bot.cog_loader.wait_lazy()
+    profile = bot.cog_loader.report()
+    profile['total_ms'] = round((time.perf_counter() - STARTED_AT) * 1000, 1)
+    print(json.dumps(profile, indent=2), file=sys.__stdout__) # The only output on stdout, see __main__
+    return 1 if profile['failed'] else 0
+
+async def main(config_data):
     """Main function to setup and run the bot."""
+    import discord
+
+    bot = create_bot(config_data, profiling=PROFILE_STARTUP)
     async with bot:
         # It's good practice to remove the default help command if you have a custom one in a cog
         # bot.remove_command('help')
@@ -101,7 +134,11 @@ async def main():
         except Exception: # Default help command might not exist if intents are minimal or already removed
             print("Default help command not found or already removed.")
 
-        await load_all_cogs()
+        if PROFILE_STARTUP:
+            return await profile_startup(bot)
+
+        await load_all_cogs(bot)
+        bot.cog_loader.start_lazy() # Overlaps with logging in and connecting to the gateway
         try:
             await bot.start(config_data["BOT_TOKEN"])
         except discord.LoginFailure:
@@ -114,8 +151,16 @@ async def main():
 
 # Run the bot
 if __name__ == "__main__":
+    if "--timestamp-log" in sys.argv: # Passed by run_bot_manager.py, which sends both streams to bot.log; for `view_log --since`
+        from utils.logreader import TimestampedStream
+        sys.stdout = TimestampedStream(sys.stdout)
+        sys.stderr = TimestampedStream(sys.stderr)
+    if PROFILE_STARTUP: # Log lines go to stderr, so `--profile-startup | jq` only sees the JSON profile
+        sys.stdout = sys.stderr
+
+    config_data = load_config(require_token=not PROFILE_STARTUP)
     try:
-        asyncio.run(main())
+        sys.exit(asyncio.run(main(config_data)))
     except KeyboardInterrupt:
         print("Bot shutdown requested by user (KeyboardInterrupt).")
     except Exception as e:
@@ -1,15 +1,32 @@
 import discord
 from discord.ext import commands
-import subprocess
+import functools
+import io
 import os
+import time
+from utils.gitservice import GitError, GitService
+from utils.logreader import LEVEL_WORDS, LogReader, parse_since
 
 # REPO_PATH should ideally be the root of the git repository.
 # If this cog is in ./cogs/ and the script is in ./, then "." is correct.
 REPO_PATH = "."
+LOG_MAX_LINES = 5000 # Most lines view_log returns at once
 
 class AdminCog(commands.Cog, name="Admin"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.git = GitService(REPO_PATH) # Async git with cached version info; never blocks the event loop
+        self.log_reader = LogReader(os.path.join(REPO_PATH, "bot.log"))
+
+    async def cog_load(self):
+        if not getattr(self.bot, 'profiling', False):
+            self.bot.loop.create_task(self._warm_version_cache())
+
+    async def _warm_version_cache(self):
+        try:
+            await self.git.version_info() # So the first current_version answers instantly
+        except (GitError, OSError) as e:
+            print(f"Could not read git version info: {e}")
 
     @commands.command(name="switch_version", aliases=["checkout_version"])
     @commands.is_owner()
@@ -27,14 +44,10 @@ class AdminCog(commands.Cog, name="Admin"):
 
         await ctx.send(f"Attempting to switch to version '{version_identifier}'...")
         try:
-            # Use 'git show' which is a safe way to check if a reference is valid
-            # without altering the working directory or index.
-            # It will error out if the ref is invalid.
-            subprocess.check_output(
-                ["git", "show", "--quiet", version_identifier], # --quiet suppresses output on success
-                cwd=REPO_PATH,
-                stderr=subprocess.STDOUT # Redirect stderr to stdout to catch git errors
-            )
+            # Check the reference resolves to a commit without altering the working directory or index
+            if not await self.git.ref_exists(version_identifier):
+                await ctx.send(f"Error: Version '{version_identifier}' not found or is invalid.")
+                return
 
             # Create the flag file for the update_and_run.sh script
             # Ensure REPO_PATH is correctly pointing to where update_and_run.sh expects the file
@@ -43,9 +56,6 @@ class AdminCog(commands.Cog, name="Admin"):
                 f.write(version_identifier)
             await ctx.send(f"Request to switch to version '{version_identifier}' has been sent. The bot will restart shortly if successful. Please monitor `bot.log`.")
             # The update_and_run.sh script will detect this file and handle the switch.
-        except subprocess.CalledProcessError as e:
-            error_output = e.output.decode(errors='ignore').strip()
-            await ctx.send(f"Error: Version '{version_identifier}' not found or is invalid. Git output:\n```\n{error_output}\n```")
         except FileNotFoundError: # If git command itself is not found
             await ctx.send("Error: Git command not found. Ensure git is installed and in PATH on the server.")
         except Exception as e:
@@ -65,15 +75,14 @@ class AdminCog(commands.Cog, name="Admin"):
             return
         try:
             # Check if tag already exists
-            existing_tags = subprocess.check_output(["git", "tag"], cwd=REPO_PATH, text=True).splitlines()
-            if tag_name in existing_tags:
+            if tag_name in await self.git.tags():
                 await ctx.send(f"Error: Tag '{tag_name}' already exists. Choose a different name.")
                 return
 
-            subprocess.check_output(["git", "tag", tag_name], cwd=REPO_PATH, stderr=subprocess.STDOUT)
+            await self.git.create_tag(tag_name)
             await ctx.send(f"Current running version successfully tagged as '{tag_name}' locally. \nTo push this tag to the remote repository (e.g., GitHub), run `git push origin {tag_name}` on the server.")
-        except subprocess.CalledProcessError as e:
-            await ctx.send(f"Error tagging version. Git output:\n```\n{e.output.decode(errors='ignore').strip()}\n```")
+        except GitError as e:
+            await ctx.send(f"Error tagging version. Git output:\n```\n{e.output or e}\n```")
         except FileNotFoundError:
             await ctx.send("Error: Git command not found. Ensure git is installed and in PATH on the server.")
         except Exception as e:
@@ -84,30 +93,22 @@ class AdminCog(commands.Cog, name="Admin"):
     async def current_version_status(self, ctx: commands.Context):
         """Displays the current git branch, commit hash, and any tags pointing to it."""
         try:
-            branch = subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=REPO_PATH, text=True).strip()
-            commit_hash = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_PATH, text=True).strip()
-            tags = subprocess.check_output(["git", "tag", "--points-at", "HEAD"], cwd=REPO_PATH, text=True).strip()
+            info = await self.git.version_info() # Cached until HEAD or a ref changes
 
             message = f"**Current Bot Version:**\n"
-            message += f"- Branch: `{branch}`\n"
-            message += f"- Commit: `{commit_hash}`\n"
-            if tags:
-                # Replace actual newline characters from git output with ", " for display
-                tags_formatted = tags.replace('\n', ', ')
-                message += f"- Tags: `{tags_formatted}`"
+            message += f"- Branch: `{info['branch']}`\n"
+            message += f"- Commit: `{info['commit']}`\n"
+            if info['tags']:
+                message += f"- Tags: `{', '.join(info['tags'])}`"
             else:
                 message += "- Tags: `No tags on current commit.`"
 
-            # Get last commit details
-            commit_details = subprocess.check_output(
-                ["git", "log", "-1", "--pretty=format:%h %an, %ar : %s"],
-                cwd=REPO_PATH, text=True
-            ).strip()
-            message += f"\n- Last Commit: `{commit_details}`"
+            # Discord renders the relative commit time, so the cached details never show a stale "x minutes ago"
+            message += f"\n- Last Commit: `{info['last_commit']}` (<t:{info['committed_at']}:R>)"
 
             await ctx.send(message)
-        except subprocess.CalledProcessError as e:
-            await ctx.send(f"Error getting current version details. Git output:\n```\n{e.output.decode(errors='ignore').strip()}\n```")
+        except GitError as e:
+            await ctx.send(f"Error getting current version details. Git output:\n```\n{e.output or e}\n```")
         except FileNotFoundError:
             await ctx.send("Error: Git command not found. Ensure git is installed and in PATH on the server.")
         except Exception as e:
@@ -118,8 +119,7 @@ class AdminCog(commands.Cog, name="Admin"):
     async def list_tags(self, ctx: commands.Context):
         """Lists all local git tags in the repository."""
         try:
-            tags_output = subprocess.check_output(["git", "tag"], cwd=REPO_PATH, text=True, stderr=subprocess.STDOUT)
-            tags = tags_output.strip().splitlines()
+            tags = await self.git.tags()
 
             if not tags:
                 await ctx.send("No local tags found in the repository.")
@@ -135,10 +135,10 @@ class AdminCog(commands.Cog, name="Admin"):
 
             await ctx.send(message)
 
-        except subprocess.CalledProcessError as e:
+        except GitError as e:
             # This might happen if `git tag` itself fails for some reason, though unlikely for a simple listing.
             # Or if the repo is not a git repo, but other commands would likely fail first.
-            error_output = e.output.decode(errors='ignore').strip()
+            error_output = e.output or str(e)
             if "not a git repository" in error_output.lower(): # More specific error
                  await ctx.send("Error: The current directory does not seem to be a git repository.")
             else:
@@ -150,69 +150,86 @@ class AdminCog(commands.Cog, name="Admin"):
 
     @commands.command(name="view_log", aliases=["show_log", "botlog"])
     @commands.is_owner()
-    async def view_log(self, ctx: commands.Context, lines: int = 20):
-        """Displays the last N lines from bot.log.
-        Usage: !view_log [number_of_lines]
+    async def view_log(self, ctx: commands.Context, *, query: str = ""):
+        """Displays the last N lines from bot.log, optionally filtered.
+        Usage: !view_log [number_of_lines] [--level error|warning] [--since <when>] [keyword]
+        `--since` takes a duration back from now (30m, 2h, 1d) or a date/time (2024-05-01, 2024-05-01T13:00).
         Example: !view_log 50
+        Example: !view_log 30 --level error --since 2h voice
         Defaults to 20 lines if no number is provided.
         """
-        if lines <= 0:
-            await ctx.send("Number of lines must be a positive integer.")
+        lines, filters, error = self._parse_log_query(query)
+        if error:
+            await ctx.send(error)
             return
 
-        log_file_path = os.path.join(REPO_PATH, "bot.log") # Assuming bot.log is in REPO_PATH
+        if not os.path.exists(self.log_reader.path):
+            await ctx.send(f"Log file (`{self.log_reader.path}`) not found.")
+            return
 
         try:
-            if not os.path.exists(log_file_path):
-                await ctx.send(f"Log file (`{log_file_path}`) not found.")
-                return
-
-            if os.path.getsize(log_file_path) == 0:
-                await ctx.send(f"Log file (`{log_file_path}`) is empty.")
-                return
-
-            # Read the last N lines efficiently
-            # Using subprocess to call `tail` is generally robust and efficient for this.
-            try:
-                log_output = subprocess.check_output(
-                    ["tail", "-n", str(lines), log_file_path],
-                    text=True,
-                    stderr=subprocess.STDOUT
-                )
-            except FileNotFoundError: # If `tail` command is not found (less likely on Linux/macOS)
-                # Fallback to Python read if tail is not available
-                with open(log_file_path, 'r', encoding='utf-8', errors='replace') as f:
-                    all_lines = f.readlines()
-                log_output = "".join(all_lines[-lines:])
-
-
-            if not log_output.strip():
-                await ctx.send(f"The last {lines} lines of the log are empty or contain only whitespace.")
-                return
-
-            # Discord message character limit is 2000.
-            # Add triple backticks for code block, and "Last X lines of bot.log:\n"
-            header = f"Last {lines} lines of `bot.log`:\n"
-            max_len_for_log = 2000 - len(header) - 7 # 7 for ```\n and \n```
-
-            if len(log_output) > max_len_for_log:
-                # If too long, send as a file or truncate
-                # Sending as file is better for large logs
-                try:
-                    with open(log_file_path, 'rb') as fp: # Read as bytes for file sending
-                        discord_file = discord.File(fp, filename="bot_log_tail.txt")
-                    await ctx.send(f"The log output is too long. Here are the last {lines} lines as an attachment:", file=discord_file)
-                except Exception as e_file:
-                    await ctx.send(f"Log output is too long, and I couldn't send it as a file: {str(e_file)}. Here's a truncated version:\n```\n{log_output[-max_len_for_log:]}\n```")
-
-            else:
-                await ctx.send(f"{header}```\n{log_output.strip()}\n```")
-
-        except subprocess.CalledProcessError as e:
-            # This could happen if `tail` fails for some reason.
-            await ctx.send(f"Error reading log with tail: {e.output.decode(errors='ignore').strip()}")
+            # The reader seeks backwards from the end of the file; still file I/O, so off the event loop
+            log_lines = await self.bot.loop.run_in_executor(None, functools.partial(self.log_reader.tail, lines, **filters))
         except Exception as e:
             await ctx.send(f"An unexpected error occurred while viewing the log: {str(e)}")
+            return
+
+        description = f"Last {len(log_lines)} lines of `bot.log`"
+        if 'level' in filters:
+            description += f" at level {filters['level']} or worse"
+        if 'since' in filters:
+            description += f" since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(filters['since']))}"
+        if 'keyword' in filters:
+            description += f" containing `{filters['keyword']}`"
+        if not log_lines:
+            await ctx.send(f"No log lines{' match' if filters else ' found'}.")
+            return
+        log_output = "\n".join(log_lines)
+
+        # Discord message character limit is 2000.
+        # Add triple backticks for code block, and the description line
+        header = f"{description}:\n"
+        max_len_for_log = 2000 - len(header) - 7 # 7 for ```\n and \n```
+
+        if len(log_output) > max_len_for_log:
+            # Only the requested lines are attached, not the whole log
+            discord_file = discord.File(io.BytesIO(log_output.encode('utf-8')), filename="bot_log_tail.txt")
+            await ctx.send(f"{description} (attached, too long for a message):", file=discord_file)
+        else:
+            await ctx.send(f"{header}```\n{log_output}\n```")
+
+    @staticmethod
+    def _parse_log_query(query):
+        """Splits a view_log query into (line count, LogReader.tail filters, error message or None)."""
+        tokens = query.split()
+        lines = 20
+        if tokens and tokens[0].lstrip('-').isdigit():
+            lines = int(tokens.pop(0))
+            if lines <= 0:
+                return lines, {}, "Number of lines must be a positive integer."
+            lines = min(lines, LOG_MAX_LINES)
+        filters = {}
+        keywords = []
+        while tokens:
+            token = tokens.pop(0)
+            if token in ("--level", "--since") and not tokens:
+                return lines, filters, f"`{token}` needs a value."
+            if token == "--level":
+                level = tokens.pop(0).lower()
+                if level not in LEVEL_WORDS:
+                    return lines, filters, f"Unknown level `{level}`. Use one of: {', '.join(LEVEL_WORDS)}."
+                filters['level'] = level
+            elif token == "--since":
+                value = tokens.pop(0)
+                since = parse_since(value)
+                if since is None:
+                    return lines, filters, f"Could not understand `--since {value}`. Use e.g. `30m`, `2h`, `1d` or `2024-05-01T13:00`."
+                filters['since'] = since
+            else:
+                keywords.append(token)
+        if keywords:
+            filters['keyword'] = " ".join(keywords)
+        return lines, filters, None
 
 
 async def setup(bot: commands.Bot):
@@ -1,108 +1,530 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 import asyncio
-import yt_dlp
 import functools
+import itertools
 import random
-
-# Suppress noise about console usage from errors
-yt_dlp.utils.bug_reports_message = lambda: ''
-
-# YTDL options
-ytdl_format_options = {
-    'format': 'bestaudio/best',
-    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-    'restrictfilenames': True,
-    'noplaylist': True,
-    'nocheckcertificate': True,
-    'ignoreerrors': False,
-    'logtostderr': False,
-    'quiet': True,
-    'no_warnings': True,
-    'default_search': 'auto',
-    'source_address': '0.0.0.0',  # bind to ipv4 since ipv6 addresses cause issues sometimes
-    'postprocessors': [{
-        'key': 'FFmpegExtractAudio',
-        'preferredcodec': 'mp3',
-        'preferredquality': '192',
-    }],
-}
+import re
+import time
+from collections import Counter, deque
+from typing import List
+from utils.extraction import (
+    PRIORITY_AUTOPLAY, PRIORITY_PLAY, PRIORITY_PREFETCH, PRIORITY_SUGGEST,
+    ExtractionError, ExtractionScheduler, SchedulerSaturated, SingleFlight, create_executor, extract_entry, extract_playlist_page,
+    extract_search, is_playlist_url,
+)
+from utils.audio import PositionTracker, PrebufferedSource, VolumeTransformer
+from utils.audiocache import AudioCache
+from utils.autocomplete import RateLimiter, TitleIndex
+from utils.broadcast import BroadcastRegistry
+from utils.metrics import LatencyStats, LoopLagMonitor, StartupStats
+from utils.sessions import SessionStore
+from utils.ytcache import CACHE_FILE, ExtractionCache, normalize_key, stream_expiry
+
+COG_META = {'lazy': True} # Loaded in the background while the bot connects, see utils/cogloader.py
 
 ffmpeg_options = {
     'options': '-vn',
     "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
 }
 
-ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
+OPUS_CODECS = ('opus', 'libopus')
+
+
+def seek_options(start, before_options=''):
+    # -ss before -i seeks the input, so ffmpeg jumps there instead of decoding up to it
+    return f"-ss {start} {before_options}".strip() if start else before_options
+
+
+# Tighter input probing for (extractor, container) pairs whose headers carry complete stream
+# parameters, so ffmpeg need not read ahead to guess them. analyzeduration is in microseconds
+# (0 would mean "use the default" to ffmpeg).
+FAST_PROBE_OPTIONS = {
+    ('Youtube', 'webm'): '-probesize 32768 -analyzeduration 200000',
+    ('Youtube', 'm4a'): '-probesize 65536 -analyzeduration 200000',
+    ('local', 'ogg'): '-probesize 32768 -analyzeduration 200000', # Files written by the audio cache
+}
+
+
+class ProbeTuner:
+    """Chooses ffmpeg probe options per (extractor, container) profile.
+    A profile falls back to ffmpeg's defaults once its fast settings failed to produce audio `max_failures` times.
+    """
+
+    def __init__(self, *, enabled=True, max_failures=2):
+        self.enabled = enabled
+        self.max_failures = max_failures
+        self.failures = Counter() # profile -> starts that produced no audio with fast settings
+
+    def options(self, profile, *, safe=False):
+        if not self.enabled or safe or self.failures[profile] >= self.max_failures:
+            return ''
+        return FAST_PROBE_OPTIONS.get(profile, '')
+
+    def report_failure(self, profile):
+        self.failures[profile] += 1
+        if self.failures[profile] == self.max_failures:
+            print(f"Fast probing disabled for {profile_label(profile)} after {self.max_failures} failed starts.")
+
+
+def profile_label(profile):
+    return "/".join(part or "?" for part in profile)
+
+IDLE_TIMEOUT = 300 # Seconds alone in a channel with nothing playing before disconnecting
+QUEUE_PAGE_SIZE = 10
+PLAYLIST_FIRST_BATCH = 5 # Small first page so playback starts quickly; the rest is listed in one pass
+PLAYLIST_MAX_ENTRIES = 2000
+PREFETCH_COUNT = 3 # How many upcoming tracks the player keeps resolved
+STREAM_REFRESH_MARGIN = 300 # Seconds of validity a stream URL must have left after the track would finish
+AUTOPLAY_SEARCH_LIMIT = 5
+AUTOPLAY_HISTORY = 50 # Recently played video ids per guild that autoplay avoids
+AUTOCOMPLETE_CHOICES = 25 # Discord's maximum
+AUTOCOMPLETE_DEBOUNCE = 0.35 # Seconds a keystroke waits to see whether the user is still typing
+AUTOCOMPLETE_SEARCH_TIMEOUT = 2.0 # Keeps debounce + search + response inside Discord's 3 second deadline
+AUTOCOMPLETE_MIN_SEARCH_CHARS = 3
+SUGGESTION_TTL = 300 # Seconds a user's suggest results stay pickable with buttons or `play #n`
+SUGGESTION_PICK_RE = re.compile(r'#(\d{1,2})')
+SESSION_SNAPSHOT_INTERVAL = 10 # Seconds between write-behind snapshots of every session
+SESSION_MAX_AGE = 3600 # Sessions older than this are not restored on startup
+PRELOAD_SECONDS = 5 # How long before the end of a track the next one's ffmpeg is started
+PREBUFFER_FRAMES = 5 # Frames read ahead from the next track to be sure its decoder is up
+
+
+def format_duration(seconds):
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def parse_timestamp(text):
+    """Parses '90', '1:30' or '1:01:30' into seconds. Returns None if invalid."""
+    try:
+        parts = [int(part) for part in text.strip().split(':')]
+    except ValueError:
+        return None
+    if not 1 <= len(parts) <= 3 or any(part < 0 for part in parts):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+
+class Track:
+    """Compact queue entry. The FFmpeg source is only built when the track is about to play."""
+    __slots__ = (
+        'id', 'title', 'url', 'duration', 'uploader', 'thumbnail', 'stream_url', 'expires', 'acodec', 'is_live', 'ext', 'extractor',
+    )
+
+    def __init__(
+        self, id, title, url, duration=None, uploader=None, thumbnail=None, stream_url=None, acodec=None, is_live=None,
+        ext=None, extractor=None,
+    ):
+        self.id = id
+        self.title = title
+        self.url = url # Webpage URL, used for display and re-resolving
+        self.duration = duration
+        self.uploader = uploader
+        self.thumbnail = thumbnail
+        self.stream_url = stream_url # Direct media URL handed to FFmpeg
+        self.expires = stream_expiry(stream_url) # Unix timestamp, or None if unknown
+        self.acodec = acodec # Audio codec of the stream, e.g. 'opus'; None until known
+        self.is_live = is_live # Live streams have no fixed position, so guilds can share one decoder
+        self.ext = ext # Container of the stream, e.g. 'webm'
+        self.extractor = extractor # yt-dlp extractor key, e.g. 'Youtube'
 
+    @classmethod
+    def from_info(cls, data):
+        """Builds a Track from a yt-dlp info dict, keeping only the fields the cog uses."""
+        duration = data.get('duration')
+        return cls(
+            id=data.get('id'),
+            title=data.get('title', 'Unknown Title'),
+            url=data.get('webpage_url') or data.get('original_url'),
+            duration=int(duration) if duration else None,
+            uploader=data.get('uploader'),
+            thumbnail=data.get('thumbnail'),
+            stream_url=data.get('url'),
+            acodec=data.get('acodec'),
+            is_live=data.get('is_live'),
+            ext=data.get('ext'),
+            extractor=data.get('extractor_key'),
+        )
+
+    def expires_within(self, seconds):
+        """True if the stream URL is missing or will expire in less than `seconds`."""
+        if not self.stream_url:
+            return True
+        if self.expires is None:
+            return False
+        return self.expires - time.time() < seconds
+
+    def to_compact(self):
+        """[id, url]: enough to rebuild the track from the extraction cache, or to re-resolve it."""
+        return [self.id, self.url]
 
-class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, volume=0.5):
+    @classmethod
+    def from_compact(cls, entry, cache=None):
+        """Rebuilds a track saved with `to_compact` from cached metadata, without calling yt-dlp.
+        Without cached metadata the URL stands in for the title until the track is resolved.
+        """
+        video_id, url = entry
+        info = cache.load_info(video_id, with_stream=False) if cache and video_id else None
+        if info:
+            track = cls.from_info(info)
+            track.url = track.url or url
+            return track
+        return cls(video_id, url, url)
+
+    def update_from(self, other):
+        """Copies freshly resolved fields into this record, so queued references stay valid."""
+        for slot in self.__slots__:
+            value = getattr(other, slot)
+            if value is not None:
+                setattr(self, slot, value)
+        self.expires = other.expires # Belongs to the new stream URL, even when unknown
+
+
+class YTDLSource(VolumeTransformer):
+    cache = None # ExtractionCache shared by all guilds, owned by MusicCog
+    audio_cache = None # Optional AudioCache of frequently played tracks, owned by MusicCog
+    titles = None # TitleIndex of recently seen titles for autocomplete, owned by MusicCog
+    broadcasts = None # BroadcastRegistry sharing live stream decoders between guilds, owned by MusicCog
+    inflight = SingleFlight() # Identical concurrent extractions share one executor job
+    scheduler = None # ExtractionScheduler, owned by MusicCog
+    opus_passthrough = True # Configured by MusicCog from OPUS_PASSTHROUGH
+    crossfade_frames = 0 # 20ms frames faded over on skip, from CROSSFADE_SECONDS; 0 disables
+    probe_tuner = ProbeTuner() # Configured by MusicCog from FAST_PROBE
+
+    def __init__(self, source, *, track, volume=0.5):
         super().__init__(source, volume)
-        self.data = data
-        self.title = data.get('title')
-        self.url = data.get('webpage_url')
-        self.duration = data.get('duration')
-        self.uploader = data.get('uploader')
-        self.thumbnail = data.get('thumbnail')
+        self.track = track
+        self.title = track.title
+        self.url = track.url
+        self.duration = track.duration
+        self.uploader = track.uploader
+        self.thumbnail = track.thumbnail
+        self.fast_probe = None # Profile whose fast probe options this source was started with, if any
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
-        loop = loop or asyncio.get_event_loop()
-        # Use functools.partial to run blocking ytdl operation in executor
-        partial_extract = functools.partial(ytdl.extract_info, url, download=not stream)
-        data = await loop.run_in_executor(None, partial_extract)
+    async def extract(cls, url, *, priority=PRIORITY_PLAY, guild_id=None):
+        # Blocking ytdl work runs in the dedicated extraction scheduler, never in the default executor
+        partial_extract = functools.partial(extract_entry, url)
+        return await cls.scheduler.submit(partial_extract, priority=priority, guild_id=guild_id)
 
-        if 'entries' in data:
-            # take first item from a playlist
-            data = data['entries'][0]
+    @classmethod
+    async def resolve(cls, url, *, refresh=False, priority=PRIORITY_PLAY, guild_id=None):
+        """Resolves a URL or search query into a Track without spawning FFmpeg.
+        With `refresh`, cached stream URLs are bypassed and a new extraction always runs.
+        """
+        if cls.cache and not refresh:
+            video_id = cls.cache.lookup_id(url)
+            info = cls.cache.load_info(video_id) if video_id else None
+            if info:
+                return Track.from_info(info)
+
+        data = await cls.inflight.run(
+            ('resolve', normalize_key(url)),
+            lambda: cls._extract_and_store(url, priority, guild_id),
+        )
+        if cls.titles is not None:
+            cls.titles.add(data.get('title'), data.get('webpage_url'))
+        return Track.from_info(data)
 
-        filename = data['url'] if stream else ytdl.prepare_filename(data)
-        return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options), data=data)
+    @classmethod
+    async def _extract_and_store(cls, url, priority, guild_id):
+        data = await cls.extract(url, priority=priority, guild_id=guild_id)
+        if cls.cache:
+            cls.cache.store_info(url, data)
+        return data
 
     @classmethod
-    async def search(cls, query, *, loop=None, limit=5):
-        loop = loop or asyncio.get_event_loop()
-        partial_search = functools.partial(ytdl.extract_info, f"ytsearch{limit}:{query}", download=False)
-        data = await loop.run_in_executor(None, partial_search)
-        return data.get('entries', [])
+    async def create(cls, track, *, volume=0.5, start=0, safe_probe=False, timings=None):
+        """Builds the cheapest playable source for a resolved Track, starting `start` seconds in.
+        Opus streams at 100% volume are copied through without decoding or re-encoding;
+        everything else goes through the PCM path.
+        With `timings`, the seconds spent probing the codec and spawning ffmpeg are stored in it
+        (ffmpeg's own input probing comes later, before its first frame).
+        """
+        local_file = cls.local_file(track)
+        # Crossfading mixes PCM, so it needs every track on the PCM path. So do shared live streams,
+        # where one decode serves every guild and each guild still applies its own volume. Any volume
+        # other than 100% needs a decode too, and the PCM path can ramp it while playing.
+        opus = False
+        if cls.opus_passthrough and volume == 1.0 and not cls.crossfade_frames and not cls._shared(track):
+            if local_file: # Cached files are always Ogg/Opus
+                opus = True
+            else:
+                if track.acodec is None: # Not reported by the extractor, ask ffprobe once (ffmpeg -i if that fails)
+                    probe_started = time.perf_counter()
+                    try:
+                        codec, _ = await discord.FFmpegOpusAudio.probe(track.stream_url, method='native')
+                    except Exception as e:
+                        print(f"Codec probe failed for '{track.title}': {e}")
+                        codec = None
+                    track.acodec = codec or 'unknown'
+                    if timings is not None:
+                        timings['codec_probe'] = time.perf_counter() - probe_started
+                opus = track.acodec in OPUS_CODECS
+
+        spawn_started = time.perf_counter()
+        if opus:
+            source = YTDLOpusSource(track, start=start, safe_probe=safe_probe)
+        else:
+            source = cls.from_track(track, volume=volume, start=start, safe_probe=safe_probe)
+        if timings is not None:
+            timings['spawn'] = time.perf_counter() - spawn_started
+        return source
+
+    @classmethod
+    def from_track(cls, track, *, volume=0.5, start=0, safe_probe=False):
+        """Creates the playable source for a resolved Track. This starts the ffmpeg process."""
+        if cls._shared(track):
+            stream_url = track.stream_url
+            source = cls.broadcasts.subscribe(track.id, lambda: discord.FFmpegPCMAudio(stream_url, **ffmpeg_options))
+            return cls(source, track=track, volume=volume)
+        path, before_options, fast_probe = cls.input_for(track, start=start, safe_probe=safe_probe)
+        source = cls(discord.FFmpegPCMAudio(path, before_options=before_options, options=ffmpeg_options['options']), track=track, volume=volume)
+        source.fast_probe = fast_probe
+        return source
+
+    @classmethod
+    def input_for(cls, track, *, start=0, safe_probe=False):
+        """Returns (ffmpeg input, before_options, fast probe profile or None) for a track.
+        Cached files are preferred over the stream URL.
+        """
+        local_file = cls.local_file(track)
+        if local_file: # Reconnect options only apply to network inputs
+            profile, path, before_options = ('local', 'ogg'), local_file, ''
+        else:
+            profile, path, before_options = (track.extractor, track.ext), track.stream_url, ffmpeg_options['before_options']
+        probe_options = cls.probe_tuner.options(profile, safe=safe_probe)
+        if probe_options:
+            before_options = f"{probe_options} {before_options}".strip()
+        return path, seek_options(start, before_options), profile if probe_options else None
+
+    @classmethod
+    def _shared(cls, track):
+        return cls.broadcasts is not None and bool(track.is_live) and track.id is not None
+
+    @classmethod
+    def local_file(cls, track):
+        """Path of the track in the audio cache, or None if it has to be streamed."""
+        return cls.audio_cache.path_for(track.id) if cls.audio_cache else None
+
+    @classmethod
+    def needs_stream(cls, track, seconds):
+        """True if the track must be (re-)resolved to stay playable for `seconds`. Cached tracks never do."""
+        if cls.audio_cache and cls.audio_cache.path_for(track.id):
+            return False
+        return track.expires_within(seconds)
+
+    @classmethod
+    async def playlist_page(cls, url, start, count, *, priority=PRIORITY_PLAY, guild_id=None):
+        """Lists one slice of a playlist as metadata-only entries; see extract_playlist_page."""
+        partial_page = functools.partial(extract_playlist_page, url, start, count)
+        title, total, scanned, entries = await cls.scheduler.submit(partial_page, priority=priority, guild_id=guild_id)
+        if cls.cache:
+            for entry in entries:
+                cls.cache.store_meta(entry)
+        if cls.titles is not None:
+            cls.titles.add_many((entry['title'], entry['webpage_url']) for entry in entries)
+        return title, total, scanned, entries
+
+    @classmethod
+    async def search(cls, query, *, limit=5, priority=PRIORITY_SUGGEST, guild_id=None):
+        if cls.cache:
+            entries = cls.cache.load_search(query, limit)
+            if entries is not None:
+                return entries
+
+        entries = await cls.inflight.run(
+            ('search', limit, normalize_key(query)),
+            lambda: cls._search_and_store(query, limit, priority, guild_id),
+        )
+        return list(entries) # Callers get their own list; the entries themselves are shared
+
+    @classmethod
+    async def _search_and_store(cls, query, limit, priority, guild_id):
+        partial_search = functools.partial(extract_search, query, limit)
+        entries = await cls.scheduler.submit(partial_search, priority=priority, guild_id=guild_id)
+        if cls.cache:
+            cls.cache.store_search(query, limit, entries)
+        if cls.titles is not None:
+            cls.titles.add_many((entry.get('title'), entry.get('webpage_url')) for entry in entries)
+        return entries
+
+
+class YTDLOpusSource(discord.FFmpegOpusAudio):
+    """Plays an Opus stream at 100% volume without decoding it: ffmpeg copies the packets through
+    untouched and the bot only forwards them. Other volumes use the PCM path (see YTDLSource.create).
+    """
+
+    volume = 1.0
+
+    def __init__(self, track, *, start=0, safe_probe=False):
+        path, before_options, self.fast_probe = YTDLSource.input_for(track, start=start, safe_probe=safe_probe)
+        # codec='opus' makes discord.py pass '-c:a copy'
+        super().__init__(path, codec='opus', before_options=before_options, options=ffmpeg_options['options'])
+        self.track = track
 
 
 class MusicQueue:
+    """Deque-backed track queue.
+    Head/tail operations are O(1); indexed remove/insert/move walk from the nearer end in C.
+    A count of video ids makes duplicate checks O(1). `version` changes with every mutation.
+    """
+
     def __init__(self):
-        self._queue = []
+        self._queue = deque()
+        self._ids = Counter() # video id -> number of queued tracks with that id
+        self.version = 0 # Bumped on every change, so snapshots can tell whether the queue needs rewriting
         self._lock = asyncio.Lock()
+        self._not_empty = asyncio.Event() # Set whenever the queue has items; wakes a waiting player
 
     async def get(self):
         async with self._lock:
             if not self._queue:
                 return None
-            return self._queue.pop(0)
-
-    async def put(self, item):
+            item = self._queue.popleft()
+            self._untrack(item)
+            self._sync_not_empty()
+            self.version += 1
+            return item
+
+    async def get_wait(self):
+        """Returns the next item, waiting (without polling) until one is put if the queue is empty."""
+        while True:
+            await self._not_empty.wait()
+            item = await self.get()
+            if item is not None:
+                return item
+
+    async def put(self, item, *, dedupe=False):
+        """Appends an item. With `dedupe`, an item whose video id is already queued is skipped.
+        Returns whether the item was added.
+        """
         async with self._lock:
+            if dedupe and self.contains_id(item.id):
+                return False
             self._queue.append(item)
+            self._track(item)
+            self._not_empty.set()
+            self.version += 1
+            return True
+
+    async def extend(self, items, *, dedupe=False):
+        """Appends many items under a single lock acquisition. Returns how many were added."""
+        async with self._lock:
+            added = 0
+            for item in items:
+                if dedupe and self.contains_id(item.id):
+                    continue
+                self._queue.append(item)
+                self._track(item)
+                added += 1
+            self._sync_not_empty()
+            self.version += 1
+            return added
 
     async def clear(self):
         async with self._lock:
             self._queue.clear()
+            self._ids.clear()
+            self._not_empty.clear()
+            self.version += 1
 
     async def shuffle(self):
         async with self._lock:
-            random.shuffle(self._queue)
+            # Shuffling a deque in place is O(n^2) (indexed swaps); a list round trip is O(n)
+            items = list(self._queue)
+            random.shuffle(items)
+            self._queue = deque(items)
+            self.version += 1
 
     async def remove(self, index):
         async with self._lock:
             if 0 <= index < len(self._queue):
-                return self._queue.pop(index)
+                item = self._queue[index]
+                del self._queue[index]
+                self._untrack(item)
+                self._sync_not_empty()
+                self.version += 1
+                return item
             return None
 
+    async def move(self, from_index, to_index):
+        """Moves the item at `from_index` so it ends up at `to_index`. Returns the item, or None if out of range."""
+        async with self._lock:
+            if not (0 <= from_index < len(self._queue) and 0 <= to_index < len(self._queue)):
+                return None
+            item = self._queue[from_index]
+            del self._queue[from_index]
+            self._queue.insert(to_index, item)
+            self.version += 1
+            return item
+
+    async def dedupe(self):
+        """Drops every item whose video id already appeared earlier in the queue. Returns how many were dropped."""
+        async with self._lock:
+            if all(count == 1 for count in self._ids.values()):
+                return 0
+            seen = set()
+            kept = deque()
+            for item in self._queue:
+                if item.id is not None and item.id in seen:
+                    continue
+                seen.add(item.id)
+                kept.append(item)
+            dropped = len(self._queue) - len(kept)
+            self._queue = kept
+            self._ids = Counter(item.id for item in kept if item.id is not None)
+            self.version += 1
+            return dropped
+
+    def contains_id(self, video_id):
+        return video_id is not None and self._ids[video_id] > 0
+
+    def _track(self, item):
+        if item.id is not None:
+            self._ids[item.id] += 1
+
+    def _untrack(self, item):
+        if item.id is not None:
+            self._ids[item.id] -= 1
+            if not self._ids[item.id]:
+                del self._ids[item.id]
+
+    def _sync_not_empty(self):
+        if self._queue:
+            self._not_empty.set()
+        else:
+            self._not_empty.clear()
+
     def __len__(self):
         return len(self._queue)
 
     def __getitem__(self, index):
         return self._queue[index]
 
+    def __iter__(self):
+        return iter(self._queue)
+
+    def peek(self, count):
+        """Returns up to `count` upcoming items without removing them."""
+        return list(itertools.islice(self._queue, count))
+
+    def page(self, page, per_page=10):
+        """Returns the items on a 0-based page and the total page count.
+        Each item is fetched by index, which deque resolves by skipping whole blocks from the nearer end.
+        """
+        total_pages = max(1, -(-len(self._queue) // per_page))
+        page = min(max(page, 0), total_pages - 1)
+        start = page * per_page
+        stop = min(start + per_page, len(self._queue))
+        return [self._queue[index] for index in range(start, stop)], total_pages
+
     def is_empty(self):
         return not self._queue
 
@@ -111,6 +533,142 @@ class MusicCog(commands.Cog, name="Music"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.voice_states = {}  # guild_id: VoiceState
+        config = getattr(bot, 'config', {})
+        profiling = getattr(bot, 'profiling', False) # --profile-startup: no disk state, no background tasks
+        workers = config.get("YTDL_WORKERS", 4)
+        YTDLSource.cache = ExtractionCache(':memory:' if profiling else CACHE_FILE)
+        YTDLSource.scheduler = ExtractionScheduler(
+            max_workers=workers,
+            executor=create_executor(workers, processes=config.get("YTDL_PROCESS_POOL", False)),
+        )
+        self.extraction_mode = "process pool" if config.get("YTDL_PROCESS_POOL", False) else "threads"
+        YTDLSource.opus_passthrough = config.get("OPUS_PASSTHROUGH", True)
+        if VolumeTransformer.supports_crossfade:
+            YTDLSource.crossfade_frames = int(config.get("CROSSFADE_SECONDS", 0) * 50)
+        YTDLSource.probe_tuner = ProbeTuner(enabled=config.get("FAST_PROBE", True))
+        YTDLSource.titles = TitleIndex() # Filled from the cache by warm_up, once the bot is connected
+        self.autocomplete_searches = RateLimiter(config.get("AUTOCOMPLETE_SEARCHES_PER_SECOND", 2), burst=5)
+        self._autocomplete_tickets = {} # user id -> number of their latest autocomplete request
+        self.suggestions = {} # (guild_id, user_id) -> (expiry on the monotonic clock, suggest result entries)
+        if config.get("SHARED_LIVE_STREAMS", True):
+            YTDLSource.broadcasts = BroadcastRegistry()
+        if config.get("AUDIO_CACHE_MB", 0) > 0 and not profiling:
+            YTDLSource.audio_cache = AudioCache(
+                max_bytes=int(config["AUDIO_CACHE_MB"] * 1024 * 1024),
+                min_plays=config.get("AUDIO_CACHE_MIN_PLAYS", 3),
+            )
+        self.loop_lag = LoopLagMonitor()
+        if not profiling:
+            self.loop_lag.start(bot.loop)
+        self.sessions = SessionStore() if config.get("SESSION_RESTORE", True) and not profiling else None
+        self._saved_queue_versions = {} # guild_id -> MusicQueue.version last written to the session store
+        self._sessions_restored = False
+        self._snapshotter = bot.loop.create_task(self._snapshot_sessions()) if self.sessions else None
+        self._warm_up_task = None
+
+    async def cog_load(self):
+        if self.bot.is_ready(): # Loaded into a running bot: on_ready has already fired
+            self._start_warm_up()
+            if self.sessions:
+                self.bot.loop.create_task(self.restore_sessions())
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._start_warm_up()
+        if self.sessions and not self._sessions_restored:
+            await self.restore_sessions()
+
+    def _start_warm_up(self):
+        if self._warm_up_task is None:
+            self._warm_up_task = self.bot.loop.create_task(self.warm_up())
+
+    async def warm_up(self):
+        """Startup work kept off the path to the gateway connection: loads the autocomplete titles from
+        the extraction cache and imports yt-dlp into the extraction workers.
+        """
+        started = time.perf_counter()
+        YTDLSource.titles.add_many(
+            (info.get('title'), info.get('webpage_url')) for info in reversed(YTDLSource.cache.recent_meta(YTDLSource.titles.max_titles))
+        )
+        try:
+            await YTDLSource.scheduler.warm_up()
+        except Exception as e: # The first extraction will try again
+            print(f"Failed to warm up the extraction workers: {e}")
+            return
+        print(f"Music backend ready in {time.perf_counter() - started:.2f}s ({len(YTDLSource.titles)} titles indexed).")
+
+    async def _snapshot_sessions(self):
+        await self.bot.wait_until_ready()
+        while True:
+            await asyncio.sleep(SESSION_SNAPSHOT_INTERVAL)
+            try:
+                self.save_sessions()
+            except Exception as e:
+                print(f"Failed to snapshot music sessions: {e}")
+
+    def save_sessions(self):
+        """Writes every guild's session to the store. Queues are only rewritten when they changed."""
+        for guild_id in set(self._saved_queue_versions) - set(self.voice_states):
+            self.forget_session(guild_id)
+        for guild_id, state in list(self.voice_states.items()):
+            snapshot = state.snapshot()
+            if snapshot is None:
+                if guild_id in self._saved_queue_versions:
+                    self.forget_session(guild_id)
+                continue
+            version = state.songs.version
+            queue = None if self._saved_queue_versions.get(guild_id) == version else [track.to_compact() for track in state.songs]
+            self.sessions.save(guild_id, snapshot, queue)
+            self._saved_queue_versions[guild_id] = version
+
+    def forget_session(self, guild_id):
+        if self.sessions:
+            self.sessions.delete(guild_id)
+        self._saved_queue_versions.pop(guild_id, None)
+
+    async def restore_sessions(self):
+        """Rejoins the voice channels saved before a restart and resumes their queues.
+        Tracks are rebuilt from the extraction cache; only the ones about to play get resolved.
+        """
+        self._sessions_restored = True
+        saved = self.sessions.load_all(max_age=SESSION_MAX_AGE)
+        results = await asyncio.gather(*(self._restore_session(*session) for session in saved), return_exceptions=True)
+        for (guild_id, _, _), result in zip(saved, results):
+            if isinstance(result, Exception):
+                print(f"Could not restore music session for guild {guild_id}: {result}")
+                self.forget_session(guild_id)
+
+    async def _restore_session(self, guild_id, saved, queue):
+        guild = self.bot.get_guild(guild_id)
+        channel = guild.get_channel(saved['voice_channel']) if guild else None
+        if channel is None or guild_id in self.voice_states or not any(not member.bot for member in channel.members):
+            self.forget_session(guild_id) # Gone, already in use again, or nobody left to listen
+            return
+        text_channel = guild.get_channel(saved['text_channel']) if saved.get('text_channel') else None
+        voice = guild.voice_client # Left over from before a reload; no VoiceState owns it any more
+        if voice and voice.is_connected():
+            voice.stop()
+            if voice.channel != channel:
+                await voice.move_to(channel)
+        else:
+            voice = await channel.connect()
+        state = VoiceState(self.bot, RestoredContext(guild, text_channel))
+        state.voice = voice
+        state.volume = saved.get('volume', state.volume)
+        state.autoplay = saved.get('autoplay', False)
+        state.loop = saved.get('loop', False)
+        state.loop_queue = saved.get('loop_queue', False)
+        tracks = [Track.from_compact(entry, YTDLSource.cache) for entry in queue]
+        if saved.get('current'):
+            current = Track.from_compact(saved['current'], YTDLSource.cache)
+            state.resume_from(current, saved.get('position', 0))
+            tracks.insert(0, current)
+        self.voice_states[guild_id] = state
+        await state.songs.extend(tracks)
+        print(f"Restored music session for guild {guild_id}: {len(tracks)} tracks in {channel.name}.")
+        if text_channel:
+            try: await text_channel.send(f"I'm back! Resuming playback in {channel.mention} with {len(tracks)} songs.")
+            except discord.HTTPException: pass
 
     async def get_voice_state(self, ctx: commands.Context):
         state = self.voice_states.get(ctx.guild.id)
@@ -139,16 +697,52 @@ class MusicCog(commands.Cog, name="Music"):
 
         return state
 
-    def cog_unload(self):
-        for state in self.voice_states.values():
-            self.bot.loop.create_task(state.stop())
+    async def cog_unload(self):
+        if self.sessions:
+            if self._snapshotter:
+                self._snapshotter.cancel()
+            try:
+                self.save_sessions() # Final snapshot, so a reload resumes where playback stopped
+            except Exception as e:
+                print(f"Failed to snapshot music sessions: {e}")
+            self.sessions.close()
+            self.sessions = None
+        if self._warm_up_task:
+            self._warm_up_task.cancel()
+        # Awaited, so players are stopped and disconnected before a reloaded cog restores their sessions
+        states = list(self.voice_states.items())
+        results = await asyncio.gather(*(state.stop() for _, state in states), return_exceptions=True)
+        for (guild_id, _), result in zip(states, results):
+            if isinstance(result, Exception):
+                print(f"Failed to stop the player for guild {guild_id}: {result}")
+        self.voice_states.clear()
+        if YTDLSource.cache:
+            YTDLSource.cache.close()
+            YTDLSource.cache = None
+        if YTDLSource.audio_cache:
+            YTDLSource.audio_cache.close()
+            YTDLSource.audio_cache = None
+        if YTDLSource.broadcasts:
+            YTDLSource.broadcasts.close()
+            YTDLSource.broadcasts = None
+        if YTDLSource.scheduler:
+            YTDLSource.scheduler.shutdown()
+            YTDLSource.scheduler = None
+        self.loop_lag.stop()
 
     async def cog_before_invoke(self, ctx: commands.Context):
-        ctx.voice_state = await self.get_voice_state(ctx)
+        if ctx.command.extras.get('voice_state', True): # Diagnostics commands don't need a player
+            ctx.voice_state = await self.get_voice_state(ctx)
 
     async def cog_command_error(self, ctx: commands.Context, error: commands.CommandError):
         await ctx.send(f'An error occurred: {str(error)}')
 
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        state = self.voice_states.get(member.guild.id)
+        if state:
+            state.update_idle_timer()
+
     @commands.hybrid_command(name='join', aliases=['connect'], description="Joins your current voice channel.")
     async def join(self, ctx: commands.Context):
         """Joins the voice channel of the command author."""
@@ -177,6 +771,7 @@ class MusicCog(commands.Cog, name="Music"):
 
         await ctx.voice_state.stop()
         del self.voice_states[ctx.guild.id] # Remove state
+        self.forget_session(ctx.guild.id)
         await ctx.send("Disconnected.", ephemeral=True)
 
     @commands.hybrid_command(name='play', aliases=['p'], description="Plays a song or adds to queue.")
@@ -184,34 +779,112 @@ class MusicCog(commands.Cog, name="Music"):
         """Plays a song from URL or search query.
         If a song is already playing, adds to queue.
         """
-        if not ctx.voice_client:
-            if ctx.author.voice and ctx.author.voice.channel:
-                await ctx.author.voice.channel.connect()
-                ctx.voice_state.voice = ctx.voice_client # Update voice client in state
-            else:
-                await ctx.send("You are not connected to a voice channel, and I'm not either.", ephemeral=True)
+        error = await self._join_author(ctx.guild, ctx.author)
+        if error:
+            await ctx.send(error, ephemeral=True)
+            return
+        ctx.voice_state.voice = ctx.voice_client # Update voice client in state
+
+        pick = SUGGESTION_PICK_RE.fullmatch(search.strip())
+        if pick: # A result of the author's last suggest: already extracted, no search needed
+            entry = self._suggestion(ctx.guild.id, ctx.author.id, int(pick.group(1)))
+            if entry is None:
+                await ctx.send("No such suggestion. Use the suggest command first; its results can be picked for 5 minutes.", ephemeral=True)
                 return
-        elif not ctx.author.voice or ctx.author.voice.channel != ctx.voice_client.channel:
-            await ctx.send("You need to be in my current voice channel to play songs.", ephemeral=True)
+            await ctx.send(await self._enqueue(ctx.voice_state, Track.from_info(entry)), ephemeral=True)
+            return
+
+        if is_playlist_url(search):
+            # Entries are streamed into the queue in the background; the first one starts playing right away
+            message = await ctx.send("Loading playlist...", ephemeral=True)
+            ctx.voice_state.start_playlist_load(search, message)
             return
 
         async with ctx.typing():
             try:
-                source = await YTDLSource.from_url(search, loop=self.bot.loop, stream=True)
-            except yt_dlp.utils.DownloadError as e:
+                track = await YTDLSource.resolve(search, guild_id=ctx.guild.id)
+            except SchedulerSaturated:
+                await ctx.send("The music service is busy right now. Please try again in a moment.", ephemeral=True)
+                return
+            except ExtractionError as e:
                 await ctx.send(f"Could not find anything for `{search}` or it's not a valid URL. Error: {e}", ephemeral=True)
                 return
             except Exception as e:
                 await ctx.send(f"An error occurred while trying to process the song: {e}", ephemeral=True)
                 return
 
-        await ctx.voice_state.songs.put(source)
-        if ctx.voice_state.current is None and not ctx.voice_client.is_playing():
-            await ctx.send(f"Enqueued **{source.title}** and starting playback.", ephemeral=True)
-            # The audio_player_task will pick it up
-        else:
-            await ctx.send(f"Enqueued **{source.title}**.", ephemeral=True)
+        await ctx.send(await self._enqueue(ctx.voice_state, track), ephemeral=True)
 
+    async def _join_author(self, guild, author):
+        """Connects to the author's voice channel if the bot isn't in one.
+        Returns an error message if the author can't play songs here, otherwise None.
+        """
+        if not guild.voice_client:
+            if author.voice and author.voice.channel:
+                await author.voice.channel.connect()
+                return None
+            return "You are not connected to a voice channel, and I'm not either."
+        if not author.voice or author.voice.channel != guild.voice_client.channel:
+            return "You need to be in my current voice channel to play songs."
+        return None
+
+    @staticmethod
+    async def _enqueue(state, track):
+        """Queues a resolved track and returns the confirmation to send."""
+        await state.songs.put(track)
+        if state.current is None and not (state.voice and state.voice.is_playing()):
+            return f"Enqueued **{track.title}** and starting playback." # The audio_player_task will pick it up
+        return f"Enqueued **{track.title}**."
+
+
+    @play.autocomplete('search')
+    async def play_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        """Suggests songs while typing: known titles right away, a YouTube search once the user pauses."""
+        user_id = interaction.user.id
+        ticket = self._autocomplete_tickets.get(user_id, 0) + 1
+        self._autocomplete_tickets[user_id] = ticket
+        try:
+            if current.startswith('#'): # Picking from the user's last suggest result
+                expires, entries = self.suggestions.get((interaction.guild_id, user_id), (0, []))
+                if expires > time.monotonic():
+                    return [
+                        app_commands.Choice(name=f"#{number} {entry.get('title', 'Unknown Title')}"[:100], value=f"#{number}")
+                        for number, entry in enumerate(entries, start=1)
+                    ]
+            results = YTDLSource.titles.search(current, limit=AUTOCOMPLETE_CHOICES)
+            if len(results) >= AUTOCOMPLETE_CHOICES or len(current.strip()) < AUTOCOMPLETE_MIN_SEARCH_CHARS:
+                return self._choices(results)
+
+            await asyncio.sleep(AUTOCOMPLETE_DEBOUNCE)
+            if self._autocomplete_tickets.get(user_id) != ticket: # A newer keystroke will do the searching
+                return self._choices(results)
+
+            entries = YTDLSource.cache.load_search(current, 5) if YTDLSource.cache else None
+            if entries is None and self.autocomplete_searches.try_acquire():
+                try:
+                    # A search that times out keeps running and lands in the cache for the next keystroke
+                    entries = await asyncio.wait_for(
+                        YTDLSource.search(current, limit=5, guild_id=interaction.guild_id), AUTOCOMPLETE_SEARCH_TIMEOUT,
+                    )
+                except Exception: # Timeout, saturated scheduler or extraction error: known titles only
+                    entries = None
+            seen = {url for _, url in results}
+            for entry in entries or []:
+                if entry.get('webpage_url') and entry['webpage_url'] not in seen:
+                    results.append((entry.get('title') or entry['webpage_url'], entry['webpage_url']))
+                    seen.add(entry['webpage_url'])
+            return self._choices(results)
+        finally:
+            if self._autocomplete_tickets.get(user_id) == ticket:
+                del self._autocomplete_tickets[user_id]
+
+    @staticmethod
+    def _choices(results):
+        # Names and values are limited to 100 characters; the URL is what play receives
+        return [
+            app_commands.Choice(name=title[:100], value=url)
+            for title, url in results[:AUTOCOMPLETE_CHOICES] if len(url) <= 100
+        ]
 
     @commands.hybrid_command(name='pause', description="Pauses the current song.")
     async def pause(self, ctx: commands.Context):
@@ -240,6 +913,8 @@ class MusicCog(commands.Cog, name="Music"):
 
         # Clear queue and stop player
         await ctx.voice_state.songs.clear()
+        ctx.voice_state.last_played = None # Don't let autoplay pick up after an explicit stop
+        ctx.voice_state.cancel_playlist_loads()
         if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
             ctx.voice_client.stop() # This will trigger the 'after' in play and thus the next song logic
         # The audio_player_task will see an empty queue and current=None, effectively stopping.
@@ -267,11 +942,11 @@ class MusicCog(commands.Cog, name="Music"):
 
         # Vote skip can be implemented here if desired. For now, direct skip.
         await ctx.send(f"Skipped **{ctx.voice_state.current.title}**.", ephemeral=True)
-        ctx.voice_client.stop() # This triggers 'after' in play, which calls next.set()
+        await ctx.voice_state.skip()
 
     @commands.hybrid_command(name='queue', aliases=['q', 'playlist'], description="Shows the current song queue.")
-    async def queue_cmd(self, ctx: commands.Context): # Renamed to queue_cmd
-        """Displays the current song queue."""
+    async def queue_cmd(self, ctx: commands.Context, page: int = 1): # Renamed to queue_cmd
+        """Displays the current song queue, 10 songs per page."""
         if ctx.voice_state.songs.is_empty() and ctx.voice_state.current is None:
             await ctx.send("The queue is empty and nothing is playing.", ephemeral=True)
             return
@@ -281,19 +956,33 @@ class MusicCog(commands.Cog, name="Music"):
             embed.add_field(name="Now Playing", value=f"[{ctx.voice_state.current.title}]({ctx.voice_state.current.url})", inline=False)
 
         if not ctx.voice_state.songs.is_empty():
-            queue_list = []
-            for i, song in enumerate(ctx.voice_state.songs):
-                if i >= 10: # Limit display to 10 upcoming songs
-                    queue_list.append(f"...and {len(ctx.voice_state.songs) - i} more.")
-                    break
-                queue_list.append(f"{i + 1}. [{song.title}]({song.url})")
-            if queue_list:
-                embed.add_field(name="Up Next", value="\n".join(queue_list), inline=False)
+            songs, total_pages = ctx.voice_state.songs.page(page - 1, QUEUE_PAGE_SIZE)
+            page = min(max(page, 1), total_pages)
+            first = (page - 1) * QUEUE_PAGE_SIZE
+            queue_list = [f"{first + i + 1}. [{song.title}]({song.url})" for i, song in enumerate(songs)]
+            embed.add_field(name="Up Next", value="\n".join(queue_list), inline=False)
+            embed.set_footer(text=f"Page {page}/{total_pages} - {len(ctx.voice_state.songs)} songs queued")
         else:
             embed.add_field(name="Up Next", value="The queue is empty.", inline=False)
 
         await ctx.send(embed=embed, ephemeral=True)
 
+    @commands.hybrid_command(name='remove', description="Removes a song from the queue by its position.")
+    async def remove(self, ctx: commands.Context, position: int):
+        """Removes the song at the given queue position (as shown by the queue command)."""
+        song = await ctx.voice_state.songs.remove(position - 1)
+        if song is None:
+            return await ctx.send(f"There is no song at position {position}.", ephemeral=True)
+        await ctx.send(f"Removed **{song.title}** from the queue.", ephemeral=True)
+
+    @commands.hybrid_command(name='move', description="Moves a song to a different position in the queue.")
+    async def move(self, ctx: commands.Context, position: int, new_position: int):
+        """Moves the song at `position` to `new_position` (positions as shown by the queue command)."""
+        song = await ctx.voice_state.songs.move(position - 1, new_position - 1)
+        if song is None:
+            return await ctx.send(f"Positions must be between 1 and {len(ctx.voice_state.songs)}.", ephemeral=True)
+        await ctx.send(f"Moved **{song.title}** to position {new_position}.", ephemeral=True)
+
     @commands.hybrid_command(name='nowplaying', aliases=['np', 'current'], description="Shows the currently playing song.")
     async def nowplaying(self, ctx: commands.Context):
         """Displays the currently playing song."""
@@ -313,23 +1002,46 @@ class MusicCog(commands.Cog, name="Music"):
                 embed.add_field(name="Duration", value=duration_str, inline=True)
 
             # Progress bar (simple text based)
-            vc = ctx.voice_client
-            if isinstance(vc.source, discord.PCMVolumeTransformer) and vc.source.original:
-                 # This is a bit hacky and depends on how FFmpegPCMAudio is implemented
-                 # and if we can get progress. For simplicity, we might omit a live progress bar
-                 # or use a simpler representation.
-                 # Let's assume for now we just show total duration.
-                 pass
-
+            position = ctx.voice_state.position
+            if song.duration:
+                filled = min(int(position / song.duration * 20), 19)
+                bar = "▬" * filled + "🔘" + "▬" * (19 - filled)
+                embed.add_field(name="Progress", value=f"{bar}\n{format_duration(position)} / {format_duration(song.duration)}", inline=False)
+            else:
+                embed.add_field(name="Progress", value=format_duration(position), inline=False)
 
             await ctx.send(embed=embed, ephemeral=True)
         else:
             await ctx.send("Not playing anything right now.", ephemeral=True)
 
+    @commands.hybrid_command(name='seek', description="Jumps to a position in the current song, e.g. 1:30.")
+    async def seek(self, ctx: commands.Context, position: str):
+        """Jumps to a position (seconds, m:ss or h:mm:ss) in the current song."""
+        song = ctx.voice_state.current
+        if not song or not ctx.voice_client or not (ctx.voice_client.is_playing() or ctx.voice_client.is_paused()):
+            return await ctx.send("Not playing anything.", ephemeral=True)
+        if song.is_live or not song.duration:
+            return await ctx.send("Can't seek in a live stream.", ephemeral=True)
+        seconds = parse_timestamp(position)
+        if seconds is None:
+            return await ctx.send("Give the position as seconds, `m:ss` or `h:mm:ss`.", ephemeral=True)
+        if seconds >= song.duration:
+            return await ctx.send(f"**{song.title}** is only {format_duration(song.duration)} long.", ephemeral=True)
+
+        try:
+            seeked = await ctx.voice_state.seek(seconds)
+        except SchedulerSaturated:
+            return await ctx.send("The music service is busy right now. Please try again in a moment.", ephemeral=True)
+        except Exception as e:
+            return await ctx.send(f"Could not seek: {e}", ephemeral=True)
+        if not seeked:
+            return await ctx.send("The song changed before the seek could be applied.", ephemeral=True)
+        await ctx.send(f"Jumped to **{format_duration(seconds)}**.", ephemeral=True)
+
     @commands.hybrid_command(name='volume', aliases=['vol'], description="Changes the player volume (0-100).")
     async def volume(self, ctx: commands.Context, volume: int = None):
         """Changes the player's volume. Range: 0-100."""
-        if not ctx.voice_client or not ctx.voice_client.source:
+        if not ctx.voice_client or not ctx.voice_state.source:
             return await ctx.send("Not playing anything.", ephemeral=True)
 
         if volume is None:
@@ -338,9 +1050,17 @@ class MusicCog(commands.Cog, name="Music"):
         if not 0 <= volume <= 100:
             return await ctx.send("Volume must be between 0 and 100.", ephemeral=True)
 
-        ctx.voice_state.volume = volume / 100
-        ctx.voice_client.source.volume = ctx.voice_state.volume
-        await ctx.send(f"Volume set to **{volume}%**.", ephemeral=True)
+        try:
+            applied = await ctx.voice_state.set_volume(volume / 100)
+        except SchedulerSaturated:
+            applied = False
+        except Exception as e:
+            print(f"Could not restart '{ctx.voice_state.current.title}' at the new volume: {e}")
+            applied = False
+        if applied:
+            await ctx.send(f"Volume set to **{volume}%**.", ephemeral=True)
+        else:
+            await ctx.send(f"Volume set to **{volume}%**. It will apply from the next track.", ephemeral=True)
 
     @commands.hybrid_command(name='autoplay', description="Toggles autoplay of related songs when queue ends.")
     async def autoplay_cmd(self, ctx: commands.Context):
@@ -349,6 +1069,7 @@ class MusicCog(commands.Cog, name="Music"):
             return await ctx.send("Not connected to a voice channel.", ephemeral=True)
 
         ctx.voice_state.autoplay = not ctx.voice_state.autoplay
+        ctx.voice_state.prepare_autoplay()
         status = "enabled" if ctx.voice_state.autoplay else "disabled"
         await ctx.send(f"Autoplay is now **{status}**.", ephemeral=True)
 
@@ -357,7 +1078,10 @@ class MusicCog(commands.Cog, name="Music"):
         """Searches for songs and provides a list of suggestions."""
         async with ctx.typing():
             try:
-                entries = await YTDLSource.search(query, loop=self.bot.loop, limit=5)
+                entries = await YTDLSource.search(query, limit=5, guild_id=ctx.guild.id)
+            except SchedulerSaturated:
+                await ctx.send("The music service is busy right now. Please try again in a moment.", ephemeral=True)
+                return
             except Exception as e:
                 await ctx.send(f"Error during search: {e}", ephemeral=True)
                 return
@@ -385,8 +1109,120 @@ class MusicCog(commands.Cog, name="Music"):
                 description_lines.append(f"{i+1}. [{title}]({url}){duration_str} - *{uploader}*")
 
             embed.description = "\n".join(description_lines)
-            embed.set_footer(text="Use the play command with the song title or URL to play a suggestion.")
-            await ctx.send(embed=embed, ephemeral=True)
+            embed.set_footer(text="Pick a number below, or use the play command with #1 to #5.")
+            self._remember_suggestions(ctx.guild.id, ctx.author.id, entries)
+            await ctx.send(embed=embed, view=SuggestionView(self, ctx.author.id, entries), ephemeral=True)
+
+    def _remember_suggestions(self, guild_id, user_id, entries):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self.suggestions.items() if expires <= now]:
+            del self.suggestions[key]
+        self.suggestions[(guild_id, user_id)] = (now + SUGGESTION_TTL, entries)
+
+    def _suggestion(self, guild_id, user_id, number):
+        """Returns entry `number` (1-based) of the user's latest suggestions, or None if expired or out of range."""
+        expires, entries = self.suggestions.get((guild_id, user_id), (0, []))
+        if expires <= time.monotonic() or not 1 <= number <= len(entries):
+            return None
+        return entries[number - 1]
+
+    async def play_suggestion(self, interaction, entry):
+        """Queues a suggest result picked with a button."""
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            error = await self._join_author(interaction.guild, interaction.user)
+            if error:
+                await interaction.followup.send(error, ephemeral=True)
+                return
+            state = await self.get_voice_state(RestoredContext(interaction.guild, interaction.channel, author=interaction.user))
+            state.voice = interaction.guild.voice_client
+            message = await self._enqueue(state, Track.from_info(entry))
+        except Exception as e: # The deferred response has to be answered, or the user is left on "thinking..."
+            print(f"Could not play suggestion '{entry.get('title')}' in guild {interaction.guild.id}: {e}")
+            await interaction.followup.send(f"An error occurred while trying to process the song: {e}", ephemeral=True)
+            return
+        await interaction.followup.send(message, ephemeral=True)
+
+    @commands.command(name='musicstats', extras={'voice_state': False})
+    @commands.is_owner()
+    async def music_stats(self, ctx: commands.Context):
+        """Shows extraction cache statistics."""
+        embed = discord.Embed(title="Music Stats", color=discord.Color.dark_teal())
+        if YTDLSource.cache:
+            stats = YTDLSource.cache.stats()
+            lines = [f"Entries: {stats['entries']} in memory, {stats['disk_entries']} on disk"]
+            for namespace in sorted(set(stats['hits']) | set(stats['misses'])):
+                hits, misses = stats['hits'].get(namespace, 0), stats['misses'].get(namespace, 0)
+                lines.append(f"`{namespace}`: {hits} hits / {misses} misses ({hits / (hits + misses):.0%})")
+            embed.add_field(name="Extraction Cache", value="\n".join(lines), inline=False)
+        if YTDLSource.audio_cache:
+            stats = YTDLSource.audio_cache.stats()
+            plays = stats['hits'] + stats['misses']
+            embed.add_field(
+                name="Audio Cache",
+                value=(
+                    f"Files: {stats['files']} ({stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MiB), {stats['storing']} being stored\n"
+                    f"Plays from disk: {stats['hits']} / {plays} ({stats['hits'] / (plays or 1):.0%})"
+                ),
+                inline=False,
+            )
+        if YTDLSource.broadcasts:
+            stats = YTDLSource.broadcasts.stats()
+            embed.add_field(
+                name="Shared Live Streams",
+                value=f"Active: {stats['broadcasts']} decoders for {stats['listeners']} guilds\nStarted: {stats['started']}",
+                inline=False,
+            )
+        inflight = YTDLSource.inflight
+        embed.add_field(
+            name="Extractions",
+            value=f"Started: {inflight.started}\nCoalesced: {inflight.coalesced}\nIn flight: {len(inflight)}",
+            inline=False,
+        )
+        scheduler = YTDLSource.scheduler
+        if scheduler:
+            embed.add_field(
+                name=f"Scheduler: {self.extraction_mode} ({scheduler.running}/{scheduler.max_workers} running, {scheduler.pending_count()} waiting)",
+                value="\n".join(scheduler.summary()),
+                inline=False,
+            )
+        embed.add_field(name="Gap Between Tracks", value=VoiceState.gaps.summary(), inline=False)
+        embed.add_field(name="Event Loop Lag", value=self.loop_lag.summary(), inline=False)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='startupstats', extras={'voice_state': False})
+    @commands.is_owner()
+    async def startup_stats(self, ctx: commands.Context):
+        """Shows where time to first audio goes: extraction, codec probe, ffmpeg spawn and first frame."""
+        startup = VoiceState.startup
+        embed = discord.Embed(
+            title="Time To First Audio",
+            description="`first_frame` includes ffmpeg's input probing, which the fast probe settings shorten.",
+            color=discord.Color.dark_teal(),
+        )
+        embed.add_field(
+            name="By Stage",
+            value="\n".join(f"`{stage}`: {stats.summary()}" for stage, stats in startup.stages.items()),
+            inline=False,
+        )
+        profiles = startup.profiles()
+        if profiles:
+            embed.add_field(
+                name="Total By Input",
+                value="\n".join(f"`{label}`: {stats.summary()}" for label, stats in profiles),
+                inline=False,
+            )
+        tuner = YTDLSource.probe_tuner
+        if not tuner.enabled:
+            probing = "Fast probing is disabled (FAST_PROBE)."
+        else:
+            probing = "\n".join(
+                f"`{profile_label(profile)}`: {options}"
+                + (" (disabled after failures)" if tuner.failures[profile] >= tuner.max_failures else "")
+                for profile, options in FAST_PROBE_OPTIONS.items()
+            )
+        embed.add_field(name="Fast Probe Settings", value=probing, inline=False)
+        await ctx.send(embed=embed)
 
     # Note: A full "autoqueue" feature that automatically adds suggestions
     # when the queue is low is more complex and would best be part of the
@@ -397,11 +1233,46 @@ class MusicCog(commands.Cog, name="Music"):
     # The current `autoplay` already serves a similar purpose for *related* songs.
 
 
+class SuggestionView(discord.ui.View):
+    """Numbered buttons under a suggest result. Each one queues its entry as it was extracted by the search."""
+
+    def __init__(self, cog, owner_id, entries):
+        super().__init__(timeout=SUGGESTION_TTL)
+        self.cog = cog
+        self.owner_id = owner_id
+        for number, entry in enumerate(entries, start=1):
+            button = discord.ui.Button(label=str(number), style=discord.ButtonStyle.secondary)
+            button.callback = functools.partial(self.cog.play_suggestion, entry=entry)
+            self.add_item(button)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("These suggestions belong to someone else; use the suggest command yourself.", ephemeral=True)
+            return False
+        return True
+
+
+class RestoredContext:
+    """Stands in for the commands.Context a VoiceState is normally created from, for sessions restored
+    after a restart and for button presses. Only the attributes VoiceState uses are provided.
+    """
+
+    def __init__(self, guild, channel, author=None):
+        self.guild = guild
+        self.channel = channel # Text channel for announcements; may be None
+        self.author = author or guild.me # Used to rejoin if the voice connection drops
+
+
 class VoiceState:
+    gaps = LatencyStats() # Silence between consecutive tracks, across all guilds
+    startup = StartupStats() # Time to first audio of tracks started by the player loop, across all guilds
+
     def __init__(self, bot: commands.Bot, ctx: commands.Context): # ctx here is the initial context that created the state
         self.bot = bot
         self._ctx = ctx
-        self.current = None
+        self.current = None # Track currently playing
+        self.source = None # YTDLSource for the current track, created right before playback
+        self.clock = None # PositionTracker wrapping self.source; what the voice client actually plays
         self.voice = ctx.guild.voice_client # Initial voice client
         self.next = asyncio.Event()
         self.songs = MusicQueue()
@@ -410,77 +1281,56 @@ class VoiceState:
         self.loop = False
         self.loop_queue = False
         self.now_playing_message = None
-        self.idle_timer = None # For auto-disconnect
+        self.idle_timer = None # asyncio.TimerHandle for auto-disconnect, armed only while idle and alone
+        self.last_played = None # Seed for autoplay
+        self.prefetcher = None # Background task keeping upcoming stream URLs fresh
+        self._refreshing = {} # Track -> in-flight re-resolve task
+        self.playlist_loaders = set() # Background tasks streaming playlist entries into the queue
+        self.preload_timer = None # asyncio.TimerHandle firing PRELOAD_SECONDS before the current track ends
+        self.preloader = None # Task opening the next track's decoder
+        self.preloaded = None # (track, source, prebuffered source) queued on the clock as the next track
+        self._ended_at = None # perf_counter() at the end of the previous track, for the gap metric
+        self._retry_safe_probe = None # Track to restart with ffmpeg's default probe settings
+        self._restart = None # Track to start again at its resume position, e.g. to leave Opus passthrough
+        self._probe_suspect = None # Fast probe profile blamed if that restart does produce audio
+        self.history = deque(maxlen=AUTOPLAY_HISTORY) # Video ids of recently played tracks, oldest first
+        self._history_ids = Counter() # Same ids, for O(1) membership checks
+        self.autoplay_task = None # Background search for the track to autoplay after the current one
+        self.autoplay_candidate = None # (seed track, Track) found by that search
+        self._autoplay_seed = None
+        self._resume = None # (track, seconds): where a restored session's first track continues
 
         self.audio_player = bot.loop.create_task(self.audio_player_task())
 
     async def audio_player_task(self):
         try:
+            finished = None # Track that played to its end (or was skipped) in the previous iteration
             while True:
                 self.next.clear()
 
                 song_to_play = None
-                if self.loop and self.current:
-                    song_to_play = self.current
-                elif self.loop_queue and self.current: # Check if current exists before putting it back
-                    await self.songs.put(self.current)
-                    song_to_play = await self.songs.get()
+                restarted = self._retry_safe_probe is None and self._restart is not None
+                if self._retry_safe_probe is not None: # Its start with fast probe settings produced no audio
+                    song_to_play = self._retry_safe_probe
+                elif restarted:
+                    song_to_play, self._restart = self._restart, None
+                elif self.loop and finished:
+                    song_to_play = finished
                 else:
                     song_to_play = await self.songs.get()
+                finished = None
 
-                if song_to_play is None and self.autoplay and self.current: # Check if current exists for autoplay
-                    if not self._ctx or not self._ctx.channel:
-                        await asyncio.sleep(5)
-                        continue
-                    original_channel = self._ctx.channel
-                    try:
-                        related_query = self.current.title
-                        if hasattr(self.current, 'uploader') and self.current.uploader:
-                            related_query += f" {self.current.uploader}"
-                        entries = await YTDLSource.search(related_query, loop=self.bot.loop, limit=3)
-                        if entries:
-                            chosen_entry = next((e for e in entries if e.get('webpage_url') != self.current.url), entries[0])
-                            source = await YTDLSource.from_url(chosen_entry['webpage_url'], loop=self.bot.loop, stream=True)
-                            source.title = chosen_entry.get('title', 'Unknown Title')
-                            source.uploader = chosen_entry.get('uploader')
-                            source.duration = chosen_entry.get('duration')
-                            source.thumbnail = chosen_entry.get('thumbnail')
-                            await self.songs.put(source)
-                            song_to_play = await self.songs.get()
-                            embed = discord.Embed(title="Autoplay", description=f"Queued: [{source.title}]({source.url})", color=discord.Color.random())
-                            if source.thumbnail: embed.set_thumbnail(url=source.thumbnail)
-                            if original_channel: # Check if channel still exists
-                                await original_channel.send(embed=embed)
-                        else:
-                            await asyncio.sleep(5) # Wait before next check if no song found
-                            continue
-                    except Exception as e:
-                        print(f"Error in autoplay: {e}")
-                        if original_channel: # Check if channel still exists
-                            try: await original_channel.send(f"Error trying to autoplay: {e}", delete_after=30)
-                            except Exception: pass
-                        await asyncio.sleep(5) # Wait before next check on error
-                        continue
+                if song_to_play is None and self.autoplay and self.last_played:
+                    song_to_play = await self._autoplay_next()
 
                 if song_to_play is None:
-                    if self.voice and self.voice.is_connected() and len(self.voice.channel.members) == 1:
-                        if self.idle_timer is None:
-                            self.idle_timer = self.bot.loop.time()
-                        elif (self.bot.loop.time() - self.idle_timer) > 300: # 5 minutes (300 seconds)
-                            music_cog = self.bot.get_cog("Music")
-                            if music_cog and self._ctx and self._ctx.channel:
-                                try:
-                                    await self._ctx.channel.send(f"Leaving {self.voice.channel.mention} due to inactivity.")
-                                except discord.HTTPException:  pass
-                            await self.stop()
-                            return
-                    else:
-                        self.idle_timer = None # Reset if conditions not met (e.g. more members, or not connected)
-                    await asyncio.sleep(5)
-                    continue
+                    # Nothing to do: sleep until something is enqueued. The idle timer handles disconnecting.
+                    self._ended_at = None # Waiting for a request is not a gap between tracks
+                    self.update_idle_timer()
+                    song_to_play = await self.songs.get_wait()
 
-                self.idle_timer = None
                 self.current = song_to_play
+                self.update_idle_timer()
 
                 if not self.voice or not self.voice.is_connected():
                     # Attempt to rejoin/reconnect if user is in a channel
@@ -490,46 +1340,58 @@ class VoiceState:
                             music_cog = self.bot.get_cog("Music")
                             if music_cog: music_cog.voice_states[self._ctx.guild.id].voice = self.voice
                         except Exception as e:
-                            print(f"Failed to reconnect to voice channel: {e}")
-                            self.current = None; await asyncio.sleep(5); continue
+                            print(f"Failed to reconnect to voice channel: {e}. Player stopping.")
+                            self.current = None
+                            await self.stop()
+                            return
                     else: # User not in a voice channel, cannot auto-reconnect
                         print(f"Voice client for guild {self._ctx.guild.id} disconnected, user not in channel. Player stopping.")
-                        self.current = None;
-                        # Consider calling self.stop() or parts of it if this state should trigger full cleanup
-                        await asyncio.sleep(5); continue
+                        self.current = None
+                        await self.stop()
+                        return
 
                 try:
-                    self.voice.play(self.current, after=lambda e: self.bot.loop.call_soon_threadsafe(self.next.set))
+                    timings = {}
+                    # Re-resolve entries that were never resolved or whose stream URL is about to expire
+                    if YTDLSource.needs_stream(self.current, (self.current.duration or 0) + STREAM_REFRESH_MARGIN):
+                        extract_started = time.perf_counter()
+                        await self.refresh_track(self.current, priority=PRIORITY_PLAY)
+                        timings['extract'] = time.perf_counter() - extract_started
+                    # Only now is the ffmpeg process spawned for this track
+                    safe_probe, self._retry_safe_probe = self._retry_safe_probe is self.current, None
+                    suspect, self._probe_suspect = (self._probe_suspect if safe_probe else None), None
+                    start = self._take_resume_position()
+                    self.source = await YTDLSource.create(
+                        self.current, volume=self.volume, start=start, safe_probe=safe_probe, timings=timings,
+                    )
+                    on_first_frame = functools.partial(self._record_startup, timings, self._startup_label(), suspect, time.perf_counter())
+                    self.clock = PositionTracker(
+                        self.source, offset=start, previous_end=self._ended_at, on_gap=VoiceState.gaps.add, on_first_frame=on_first_frame,
+                    )
+                    self.voice.play(self.clock, after=lambda e: self.bot.loop.call_soon_threadsafe(self.next.set))
                 except discord.ClientException as e: # E.g., already playing
-                    print(f"Error playing audio (ClientException): {e}"); self.current = None; await asyncio.sleep(1); continue
+                    print(f"Error playing audio (ClientException): {e}"); self._cleanup_source(); self.current = None; continue
                 except Exception as e: # Other errors
-                    print(f"Unhandled error during play: {e}"); self.current = None; await asyncio.sleep(1); continue
-
-                channel_to_send = self._ctx.channel
-                if self.now_playing_message: # Delete old now playing message
-                    try: await self.now_playing_message.delete()
-                    except discord.HTTPException: pass
-
-                embed = discord.Embed(title="Now Playing", description=f"[{self.current.title}]({self.current.url})", color=discord.Color.green())
-                if hasattr(self.current, 'thumbnail') and self.current.thumbnail: embed.set_thumbnail(url=self.current.thumbnail)
-                if hasattr(self.current, 'uploader') and self.current.uploader: embed.add_field(name="Uploader", value=self.current.uploader, inline=True)
-                if hasattr(self.current, 'duration') and self.current.duration:
-                    m, s = divmod(self.current.duration, 60); h, m_rem = divmod(m, 60)
-                    duration_str = f"{m_rem:02d}:{s:02d}";
-                    if h > 0: duration_str = f"{h:02d}:{duration_str}"
-                    embed.add_field(name="Duration", value=duration_str, inline=True)
-
-                if channel_to_send: # Check if channel still exists
-                    try: self.now_playing_message = await channel_to_send.send(embed=embed)
-                    except discord.Forbidden: print(f"Missing permissions to send message in {channel_to_send.name if channel_to_send else 'unknown channel'}")
-                    except discord.HTTPException as e: print(f"Failed to send Now Playing message: {e}")
-
-                await self.next.wait()
-
-                if self.current: self.current.cleanup() # Cleanup the source
+                    print(f"Unhandled error during play: {e}"); self._cleanup_source(); self.current = None; continue
+
+                await self._track_started(restarted=restarted)
+                while True:
+                    await self.next.wait()
+                    self.next.clear()
+                    if not await self._take_handoff():
+                        break
+                    # The tracker already continued with the preloaded track without a gap; only bookkeeping is left
+                    await self._track_started()
+
+                self._ended_at = self.clock.ended_at if self.clock else None
+                self._check_fast_probe()
+                self._cleanup_source() # Terminates the ffmpeg process of the finished track
+                if self._retry_safe_probe is None and self._restart is None: # Either way the track is not done yet
+                    finished = self.current
+                    await self._requeue_finished(finished)
                 self.current = None # Clear current song
 
-                if not self.loop and self.now_playing_message: # Delete NP message if not looping current song
+                if not self.loop and self._restart is None and self.now_playing_message: # Delete NP message if not playing the song again
                     try: await self.now_playing_message.delete(); self.now_playing_message = None
                     except discord.HTTPException: pass
         except asyncio.CancelledError:
@@ -539,14 +1401,492 @@ class VoiceState:
         finally:
             # This finally block ensures that if the task exits for any reason (cancelled or unhandled exception),
             # we attempt some cleanup.
-            if self.current: self.current.cleanup()
+            self._cleanup_source()
             # The VoiceState itself should be cleaned up by MusicCog if the task ends unexpectedly.
             # For example, cog_unload or a leave command would trigger state.stop() which cancels this task.
             print(f"Audio player task for guild {self._ctx.guild.id if self._ctx else 'Unknown'} has conclusively ended.")
 
+    def resume_from(self, track, seconds):
+        """Makes `track` start `seconds` in when the player gets to it (used when restoring a session)."""
+        self._resume = (track, seconds)
+
+    def _take_resume_position(self):
+        resume, self._resume = self._resume, None
+        if resume is None or resume[0] is not self.current:
+            return 0
+        seconds = int(resume[1])
+        duration = self.current.duration
+        if self.current.is_live or (duration and seconds >= duration - 1):
+            return 0
+        return seconds
+
+    def snapshot(self):
+        """Compact, JSON-serializable settings of this session (the queue is saved separately),
+        or None if there is nothing worth restoring.
+        """
+        if not self.voice or not self.voice.is_connected() or (self.current is None and self.songs.is_empty()):
+            return None
+        return {
+            'voice_channel': self.voice.channel.id,
+            'text_channel': self._ctx.channel.id if self._ctx.channel else None,
+            'current': self.current.to_compact() if self.current else None,
+            'position': round(self.position, 1),
+            'volume': self.volume,
+            'autoplay': self.autoplay,
+            'loop': self.loop,
+            'loop_queue': self.loop_queue,
+        }
+
+    def _startup_label(self):
+        track = self.current
+        profile = ('local', 'ogg') if YTDLSource.local_file(track) else (track.extractor, track.ext)
+        return profile_label(profile) + (" (fast probe)" if getattr(self.source, 'fast_probe', None) else "")
+
+    @staticmethod
+    def _record_startup(timings, label, suspect, play_started, first_frame_at):
+        # Runs on the audio thread when the first frame is read
+        timings['first_frame'] = first_frame_at - play_started
+        timings['total'] = sum(timings.get(stage, 0.0) for stage in ('extract', 'codec_probe', 'spawn', 'first_frame'))
+        VoiceState.startup.add(timings, label)
+        if suspect: # Default settings worked where the fast ones did not
+            YTDLSource.probe_tuner.report_failure(suspect)
+
+    def _check_fast_probe(self):
+        """A source started with fast probe settings that ended before its first frame is retried once with the defaults."""
+        clock = self.clock
+        fast_probe = getattr(self.source, 'fast_probe', None)
+        if fast_probe and clock and clock.ended_at is not None and not clock.frames and not clock.offset and clock.original is self.source:
+            print(f"'{self.current.title}' produced no audio with fast probe settings, retrying with the defaults.")
+            self._retry_safe_probe = self.current
+            self._probe_suspect = fast_probe
+
+    async def _track_started(self, *, restarted=False):
+        """Bookkeeping once a track plays. `restarted` means the same track was started again mid-way
+        (see set_volume), which is not a new play and keeps its now playing message.
+        """
+        if not restarted:
+            self.last_played = self.current
+            if YTDLSource.titles is not None:
+                YTDLSource.titles.add(self.current.title, self.current.url)
+            self._remember_played(self.current)
+            if YTDLSource.audio_cache:
+                YTDLSource.audio_cache.record_play(self.current)
+        self.prepare_autoplay() # Search while this track plays, not once the queue has run dry
+        self._start_prefetch()
+        self._schedule_preload()
+        if not restarted:
+            await self._announce_now_playing()
+
+    async def _take_handoff(self):
+        """Adopts the preloaded track if the clock switched to it. Returns False if playback really stopped."""
+        handoff, self.preloaded = self.preloaded, None
+        if handoff is None or self.clock is None or self.clock.original is not handoff[2]:
+            return False
+        track, source, _ = handoff
+        finished = self.current
+        if self._next_is(track):
+            await self.songs.get()
+        elif self.autoplay_candidate and self.autoplay_candidate[1] is track:
+            self.autoplay_candidate = None
+            await self._announce_autoplay(track)
+        await self._requeue_finished(finished)
+        self.current, self.source = track, source
+        return True
+
+    async def _requeue_finished(self, finished):
+        """Puts a track that stopped playing back at the end of the queue if the whole queue loops.
+        Every way a track ends goes through here: the player loop, the gapless handoff and the crossfade skip.
+        """
+        if self.loop_queue and not self.loop and finished is not None:
+            await self.songs.put(finished)
+
+    def _next_is(self, track):
+        # Called from the audio thread too; indexing a deque is atomic, iterating it is not
+        try:
+            return self.songs[0] is track
+        except IndexError:
+            return False
+
+    def _upcoming(self):
+        """The track that plays next: the queue head, else a ready autoplay pick. Safe on the audio thread."""
+        try:
+            return self.songs[0]
+        except IndexError:
+            pass
+        candidate = self.autoplay_candidate
+        if self.autoplay and candidate is not None and candidate[0] is self.current:
+            return candidate[1]
+        return None
+
+    def _schedule_preload(self):
+        if self.preload_timer is not None:
+            self.preload_timer.cancel()
+            self.preload_timer = None
+        track = self.current
+        if self.loop or not track or not track.duration or track.is_live:
+            return
+        remaining = track.duration - self.position
+        self.preload_timer = self.bot.loop.call_later(max(0, remaining - PRELOAD_SECONDS), self._start_preload)
+
+    def _start_preload(self):
+        self.preload_timer = None
+        if not self.current or not self.current.duration:
+            return
+        if self.current.duration - self.position > PRELOAD_SECONDS + 1: # Paused or seeked back since it was armed
+            self._schedule_preload()
+            return
+        if self.preloaded or (self.preloader and not self.preloader.done()):
+            return
+        self.preloader = self.bot.loop.create_task(self._preload_next())
+
+    async def _preload_next(self):
+        """Starts the next track's ffmpeg and reads its first frames, then queues it on the clock
+        so the switch happens on the audio thread the moment the current track runs out.
+        """
+        track = self._upcoming()
+        if track is None or self.loop:
+            return
+        current, clock = self.current, self.clock
+        buffered = None
+        try:
+            if YTDLSource.needs_stream(track, PRELOAD_SECONDS + (track.duration or 0) + STREAM_REFRESH_MARGIN):
+                await asyncio.shield(self.refresh_track(track, priority=PRIORITY_PLAY))
+            source = await YTDLSource.create(track, volume=self.volume)
+            if not clock.accepts(source): # E.g. PCM after an Opus passthrough track: needs its own voice.play
+                source.cleanup()
+                return
+            buffered = PrebufferedSource(source)
+            filled = await asyncio.shield(self.bot.loop.run_in_executor(None, buffered.fill, PREBUFFER_FRAMES))
+        except asyncio.CancelledError:
+            if buffered is not None:
+                buffered.cleanup()
+            raise
+        except Exception as e:
+            print(f"Preloading '{track.title}' failed, it will start normally: {e}")
+            if buffered is not None:
+                buffered.cleanup()
+            return
+        if isinstance(source, YTDLSource):
+            source.volume = self.volume # In case it changed while preloading
+        if (
+            not filled or self.current is not current or self.clock is not clock or self._upcoming() is not track
+            or source.volume != self.volume # Opus source started at a gain that has since changed
+        ):
+            buffered.cleanup()
+            return
+        self.preloaded = (track, source, buffered)
+        clock.queue_next(
+            buffered,
+            accept=lambda: not self.loop and self._upcoming() is track,
+            on_advance=lambda: self.bot.loop.call_soon_threadsafe(self.next.set),
+        )
+
+    def _cancel_preload(self):
+        if self.preload_timer is not None:
+            self.preload_timer.cancel()
+            self.preload_timer = None
+        if self.preloader and not self.preloader.done():
+            self.preloader.cancel()
+        self.preloaded = None # A source already queued on the clock is cleaned up with the clock
+
+    async def _autoplay_next(self):
+        """Returns the autoplay pick for the last played track, waiting for the search only if it was not
+        precomputed while that track played. Returns None if nothing suitable was found; the player then
+        simply waits for the next enqueue instead of retrying on a timer.
+        """
+        self.prepare_autoplay()
+        if self.autoplay_task and not self.autoplay_task.done():
+            await asyncio.wait({self.autoplay_task}) # Doesn't raise if the search itself gets cancelled
+        candidate, self.autoplay_candidate = self.autoplay_candidate, None
+        if candidate is None or candidate[0] is not self.last_played:
+            return None
+        await self._announce_autoplay(candidate[1])
+        return candidate[1]
+
+    def prepare_autoplay(self):
+        """Starts looking for the follow-up of the playing (or last played) track, if autoplay would need one."""
+        seed = self.current or self.last_played
+        if not self.autoplay or seed is None or not self.songs.is_empty():
+            return
+        if self._autoplay_seed is seed and (self.autoplay_candidate or (self.autoplay_task and not self.autoplay_task.done())):
+            return
+        if self.autoplay_task and not self.autoplay_task.done():
+            self.autoplay_task.cancel()
+        self.autoplay_candidate = None
+        self._autoplay_seed = seed
+        self.autoplay_task = self.bot.loop.create_task(self._find_related(seed))
+
+    async def _find_related(self, seed):
+        try:
+            related_query = seed.title
+            if seed.uploader:
+                related_query += f" {seed.uploader}"
+            entries = await YTDLSource.search(related_query, limit=AUTOPLAY_SEARCH_LIMIT, priority=PRIORITY_AUTOPLAY, guild_id=self._ctx.guild.id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in autoplay: {e}")
+            return
+        candidates = [entry for entry in entries if entry.get('id') and entry['id'] != seed.id]
+        if not candidates:
+            return
+        fresh = [entry for entry in candidates if entry['id'] not in self._history_ids]
+        if fresh:
+            chosen_entry = fresh[0]
+        else: # Everything related was played recently: take whichever was played longest ago
+            order = {video_id: index for index, video_id in enumerate(self.history)}
+            chosen_entry = min(candidates, key=lambda entry: order.get(entry['id'], -1))
+        # Search entries are fully extracted, so they already carry a stream URL
+        self.autoplay_candidate = (seed, Track.from_info(chosen_entry))
+        if self.current is seed and self.preload_timer is None: # The preload window came before the search finished
+            self._start_preload()
+
+    def _remember_played(self, track):
+        if track.id is None:
+            return
+        if len(self.history) == self.history.maxlen:
+            oldest = self.history[0]
+            self._history_ids[oldest] -= 1
+            if not self._history_ids[oldest]:
+                del self._history_ids[oldest]
+        self.history.append(track.id)
+        self._history_ids[track.id] += 1
+
+    async def _announce_autoplay(self, track):
+        original_channel = self._ctx.channel if self._ctx else None
+        if not original_channel:
+            return
+        embed = discord.Embed(title="Autoplay", description=f"Queued: [{track.title}]({track.url})", color=discord.Color.random())
+        if track.thumbnail: embed.set_thumbnail(url=track.thumbnail)
+        try: await original_channel.send(embed=embed)
+        except discord.HTTPException: pass
+
+    def update_idle_timer(self):
+        """Arms the auto-disconnect timer while nothing is playing and the bot is alone in its channel,
+        and disarms it otherwise. Called when playback starts/stops and on voice state updates.
+        """
+        idle = self.current is None and self.songs.is_empty()
+        alone = self.voice and self.voice.is_connected() and len(self.voice.channel.members) == 1
+        if idle and alone:
+            if self.idle_timer is None:
+                self.idle_timer = self.bot.loop.call_later(IDLE_TIMEOUT, lambda: self.bot.loop.create_task(self._leave_idle()))
+        elif self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    async def _leave_idle(self):
+        self.idle_timer = None
+        if self.voice and self.voice.is_connected() and self._ctx and self._ctx.channel:
+            try:
+                await self._ctx.channel.send(f"Leaving {self.voice.channel.mention} due to inactivity.")
+            except discord.HTTPException: pass
+        await self.stop()
+
+    async def skip(self):
+        """Stops the current track. With crossfade enabled, fades straight into the next queued track instead
+        (not while looping the current track, which the player loop restarts).
+        """
+        outgoing = self.source
+        if YTDLSource.crossfade_frames and not self.loop and isinstance(outgoing, YTDLSource) and not self.songs.is_empty():
+            track = self.songs.peek(1)[0]
+            try:
+                if YTDLSource.needs_stream(track, (track.duration or 0) + STREAM_REFRESH_MARGIN):
+                    await self.refresh_track(track, priority=PRIORITY_PLAY)
+                incoming = YTDLSource.from_track(track, volume=self.volume)
+            except Exception as e:
+                print(f"Could not crossfade into '{track.title}', skipping normally: {e}")
+            else:
+                # The player or the queue may have moved on while the next track was being prepared
+                still_current = self.source is outgoing and self.voice and (self.voice.is_playing() or self.voice.is_paused())
+                if still_current and self.songs.peek(1) == [track]:
+                    await self.songs.remove(0)
+                    await self._requeue_finished(outgoing.track)
+                    incoming.crossfade_from(outgoing, YTDLSource.crossfade_frames)
+                    self._cancel_preload() # A preloaded copy of this track is declined by the clock and cleaned up
+                    self.current, self.source = track, incoming
+                    self.clock.swap(incoming, cleanup_old=False) # The outgoing source is now only read (and cleaned up) by the fade
+                    await self._track_started()
+                    return
+                incoming.cleanup()
+        if self.preloaded and self.clock and self.clock.has_next() and self.voice and self.voice.is_playing():
+            self.clock.advance() # The next track's decoder is already running; switch without stopping the player
+            return
+        if self.voice:
+            self.voice.stop() # This triggers 'after' in play, which calls next.set()
+
+    async def _announce_now_playing(self):
+        channel_to_send = self._ctx.channel
+        if self.now_playing_message: # Delete old now playing message
+            try: await self.now_playing_message.delete()
+            except discord.HTTPException: pass
+
+        embed = discord.Embed(title="Now Playing", description=f"[{self.current.title}]({self.current.url})", color=discord.Color.green())
+        if hasattr(self.current, 'thumbnail') and self.current.thumbnail: embed.set_thumbnail(url=self.current.thumbnail)
+        if hasattr(self.current, 'uploader') and self.current.uploader: embed.add_field(name="Uploader", value=self.current.uploader, inline=True)
+        if hasattr(self.current, 'duration') and self.current.duration:
+            m, s = divmod(self.current.duration, 60); h, m_rem = divmod(m, 60)
+            duration_str = f"{m_rem:02d}:{s:02d}";
+            if h > 0: duration_str = f"{h:02d}:{duration_str}"
+            embed.add_field(name="Duration", value=duration_str, inline=True)
+
+        if channel_to_send: # Check if channel still exists
+            try: self.now_playing_message = await channel_to_send.send(embed=embed)
+            except discord.Forbidden: print(f"Missing permissions to send message in {channel_to_send.name if channel_to_send else 'unknown channel'}")
+            except discord.HTTPException as e: print(f"Failed to send Now Playing message: {e}")
+
+    def start_playlist_load(self, url, message):
+        task = self.bot.loop.create_task(self._load_playlist(url, message))
+        self.playlist_loaders.add(task)
+        task.add_done_callback(self.playlist_loaders.discard)
+
+    def cancel_playlist_loads(self):
+        for task in list(self.playlist_loaders):
+            task.cancel()
+
+    async def _load_playlist(self, url, message):
+        """Flat-lists a playlist and appends it to the queue as metadata-only tracks: a few entries first so
+        playback starts, then everything else in a single pass. yt-dlp has to walk a playlist's listing pages
+        from the start to reach any slice, so listing it in many slices would fetch the early pages again each time.
+        Stream URLs are resolved later by the prefetcher/player, only for tracks that are about to play.
+        """
+        title, total, scanned, added = None, None, 0, 0
+        try:
+            # The first page gates playback; the rest is background work
+            for batch, priority in ((PLAYLIST_FIRST_BATCH, PRIORITY_PLAY), (PLAYLIST_MAX_ENTRIES - PLAYLIST_FIRST_BATCH, PRIORITY_PREFETCH)):
+                title, total, page_size, entries = await YTDLSource.playlist_page(url, scanned, batch, priority=priority, guild_id=self._ctx.guild.id)
+                scanned += page_size
+                added += await self.songs.extend([Track.from_info(entry) for entry in entries], dedupe=True)
+                if page_size < batch or (total is not None and scanned >= total):
+                    break
+                await self._edit_progress(message, f"Loading **{title}**... queued {added} songs, listing the rest.")
+        except asyncio.CancelledError:
+            await self._edit_progress(message, f"Stopped loading **{title or 'playlist'}** after queuing {added} songs.")
+            raise
+        except SchedulerSaturated:
+            await self._edit_progress(message, f"The music service is busy. Stopped loading **{title or 'playlist'}** after queuing {added} songs.")
+            return
+        except Exception as e:
+            print(f"Error loading playlist {url}: {e}")
+            await self._edit_progress(message, f"Error loading playlist after queuing {added} songs: {e}")
+            return
+
+        skipped = scanned - added
+        summary = f"Queued {added} songs from **{title or 'playlist'}**."
+        if skipped:
+            summary += f" Skipped {skipped} duplicate or unavailable entries."
+        if scanned >= PLAYLIST_MAX_ENTRIES:
+            summary += f" Only the first {PLAYLIST_MAX_ENTRIES} entries are loaded."
+        await self._edit_progress(message, summary)
+
+    @staticmethod
+    async def _edit_progress(message, content):
+        try:
+            await message.edit(content=content)
+        except discord.HTTPException:
+            pass
+
+    def refresh_track(self, track, *, priority=PRIORITY_PREFETCH):
+        """Re-resolves a track in place. Concurrent callers for the same track share one task."""
+        task = self._refreshing.get(track)
+        if task is None:
+            task = self.bot.loop.create_task(self._refresh(track, priority))
+            self._refreshing[track] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(track, None))
+        return task
+
+    async def _refresh(self, track, priority):
+        fresh = await YTDLSource.resolve(track.url, refresh=True, priority=priority, guild_id=self._ctx.guild.id)
+        track.update_from(fresh)
+
+    def _start_prefetch(self):
+        if self.prefetcher and not self.prefetcher.done():
+            self.prefetcher.cancel()
+        self.prefetcher = self.bot.loop.create_task(self._prefetch_upcoming())
+
+    async def _prefetch_upcoming(self):
+        """Resolves the next few queued tracks while the current one plays.
+        A track's URL must stay valid until it has finished, so the time before it starts counts too.
+        """
+        starts_in = (self.current.duration or 0) if self.current else 0
+        for track in self.songs.peek(PREFETCH_COUNT):
+            if YTDLSource.needs_stream(track, starts_in + (track.duration or 0) + STREAM_REFRESH_MARGIN):
+                try:
+                    # Shielded so cancelling the prefetcher never cancels a refresh the player may be awaiting
+                    await asyncio.shield(self.refresh_track(track))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Prefetch failed for '{track.title}': {e}")
+            starts_in += track.duration or 0
+
+    def _cleanup_source(self):
+        self._cancel_preload()
+        if self.clock:
+            self.clock.cleanup() # Also cleans up self.source, or a seek replacement not yet switched to
+            self.clock = None
+        if self.source:
+            self.source.cleanup()
+            self.source = None
+
+    @property
+    def position(self):
+        """Seconds into the current track, counted from the frames actually sent."""
+        return self.clock.elapsed if self.clock else 0.0
+
+    async def seek(self, seconds):
+        """Restarts the current track at `seconds` on its already resolved stream URL (or cached file).
+        Returns False if the track changed while the new source was being prepared.
+        """
+        track, clock = self.current, self.clock
+        if YTDLSource.needs_stream(track, (track.duration or 0) - seconds + STREAM_REFRESH_MARGIN):
+            await self.refresh_track(track, priority=PRIORITY_PLAY)
+        source = await YTDLSource.create(track, volume=self.volume, start=seconds)
+        if self.current is not track or self.clock is not clock:
+            source.cleanup()
+            return False
+        self.source = source
+        clock.swap(source, offset=seconds)
+        self._schedule_preload()
+        return True
+
+    async def set_volume(self, volume):
+        """Sets the volume for this and every following track. PCM sources ramp to it. An Opus passthrough
+        source has no gain stage, so leaving 100% restarts the track at the current position on the PCM
+        path; that happens at most once per track, as every later change ramps.
+        Returns False if the change only applies from the next track.
+        """
+        self.volume = volume
+        handoff = self.preloaded
+        if handoff is not None:
+            if isinstance(handoff[1], YTDLSource):
+                handoff[1].volume = volume
+            elif self.clock is not None: # Preloaded Opus source at the old gain: let the next track start normally
+                self.clock.drop_next()
+                self.preloaded = None
+        if isinstance(self.source, YTDLSource):
+            self.source.volume = volume # Ramps smoothly to the new level
+            return True
+        if self.source is None or self.current is None or self.current.is_live or not self.current.duration:
+            return False
+        if volume == 1.0:
+            return True
+        # The voice client started on Opus, so it cannot switch to PCM (see PositionTracker.accepts): play it anew
+        self.resume_from(self.current, self.position)
+        self._restart = self.current
+        self.voice.stop()
+        return True
 
     async def stop(self):
+        self.cancel_playlist_loads()
         await self.songs.clear()
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+        if self.prefetcher and not self.prefetcher.done():
+            self.prefetcher.cancel()
+        self._cancel_preload()
+        if self.autoplay_task and not self.autoplay_task.done():
+            self.autoplay_task.cancel()
         if self.audio_player and not self.audio_player.done(): # Check if task exists and not already done
             self.audio_player.cancel()
 
@@ -75,7 +75,7 @@ def start_bot():
         with open(bot_log_path, "a", encoding="utf-8") as bot_logfile:
             # Use sys.executable to ensure the same Python interpreter is used for the bot
             bot_process = subprocess.Popen(
-                [sys.executable, BOT_SCRIPT_NAME],
+                [sys.executable, BOT_SCRIPT_NAME, "--timestamp-log"], # Bot prefixes its lines with the time, for view_log --since
                 cwd=REPO_PATH,
                 stdout=bot_logfile,
                 stderr=subprocess.STDOUT # Redirect bot's stderr to its stdout (then to bot_logfile)
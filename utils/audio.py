@@ -0,0 +1,287 @@
+import threading
+import time
+from collections import deque
+
+import discord
+
+try:
+    import numpy as np
+except ImportError: # Without NumPy the player falls back to discord.PCMVolumeTransformer
+    np = None
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE # 20ms of 48kHz 16-bit stereo PCM, in bytes
+SAMPLES_PER_FRAME = FRAME_SIZE // 2 # int16 samples, both channels interleaved
+FRAME_DURATION = discord.opus.Encoder.FRAME_LENGTH / 1000 # Seconds of audio per frame
+
+
+class NumpyVolumeTransformer(discord.AudioSource):
+    """Vectorized replacement for discord.PCMVolumeTransformer.
+
+    Each 20ms frame costs a handful of NumPy operations on preallocated buffers. Volume changes
+    ramp linearly over `ramp_frames` frames instead of jumping, and an outgoing source can be
+    crossfaded into this one with `crossfade_from`.
+    """
+
+    supports_crossfade = True
+
+    def __init__(self, original, volume=1.0, *, ramp_frames=10):
+        if not isinstance(original, discord.AudioSource):
+            raise TypeError(f"expected AudioSource not {original.__class__.__name__}.")
+        if original.is_opus():
+            raise discord.ClientException("AudioSource must not be Opus encoded.")
+
+        self.original = original
+        self.ramp_frames = max(1, ramp_frames)
+        self._gain = max(float(volume), 0.0) # Gain reached at the end of the previous frame
+        self._target = self._gain
+        self._step = 0.0 # Gain added per frame while ramping...
+        self._ramp_left = 0 # ...for this many more frames; the last one lands exactly on the target
+        self._fade_source = None
+        self._fade_total = 0
+        self._fade_done = 0
+
+        self._mix = np.empty(SAMPLES_PER_FRAME, dtype=np.float32)
+        self._scratch = np.empty(SAMPLES_PER_FRAME, dtype=np.float32)
+        self._out = np.empty(SAMPLES_PER_FRAME, dtype=np.int16)
+        self._ramp = np.empty(SAMPLES_PER_FRAME // 2, dtype=np.float32)
+        # 0..1 across the frame, one value per stereo sample pair
+        self._unit_ramp = np.arange(SAMPLES_PER_FRAME // 2, dtype=np.float32) / (SAMPLES_PER_FRAME // 2)
+
+    @property
+    def volume(self):
+        return self._target
+
+    @volume.setter
+    def volume(self, value):
+        target = max(float(value), 0.0)
+        self._step = (target - self._gain) / self.ramp_frames
+        self._target = target
+        self._ramp_left = self.ramp_frames if target != self._gain else 0
+
+    def crossfade_from(self, outgoing, frames):
+        """Mixes `outgoing` in underneath this source, fading it out over `frames` frames while this
+        source fades in. The outgoing source is cleaned up once the fade completes.
+        """
+        self._drop_fade()
+        self._fade_source = outgoing
+        self._fade_total = max(1, frames)
+        self._fade_done = 0
+
+    def cleanup(self):
+        self._drop_fade()
+        self.original.cleanup()
+
+    def _drop_fade(self):
+        if self._fade_source is not None:
+            self._fade_source.cleanup()
+            self._fade_source = None
+
+    def _fill_ramp(self, start, end):
+        np.multiply(self._unit_ramp, end - start, out=self._ramp)
+        self._ramp += start
+        return self._ramp
+
+    def read(self):
+        data = self.original.read()
+        if len(data) != FRAME_SIZE: # End of stream (or a short read, which discord treats the same)
+            self._drop_fade()
+            return data
+
+        if self._fade_source is None and self._gain == self._target:
+            if self._gain == 1.0:
+                return data
+            np.multiply(np.frombuffer(data, dtype=np.int16), self._gain, out=self._mix, casting='unsafe')
+        else:
+            start = self._gain
+            if self._gain != self._target:
+                self._ramp_left = max(self._ramp_left - 1, 0)
+                end = self._gain + self._step if self._ramp_left else self._target
+                self._gain = end
+            else:
+                end = start
+            if self._fade_source is not None: # Incoming side of the crossfade fades in on top of the volume ramp
+                fade_start = self._fade_done / self._fade_total
+                fade_end = (self._fade_done + 1) / self._fade_total
+                start, end = start * fade_start, end * fade_end
+            ramp = self._fill_ramp(start, end)
+            np.multiply(np.frombuffer(data, dtype=np.int16).reshape(-1, 2), ramp[:, None], out=self._mix.reshape(-1, 2), casting='unsafe')
+            if self._fade_source is not None:
+                self._mix_outgoing()
+
+        if max(self._gain, self._target) > 1.0: # Gains up to 1.0 (crossfade weights sum to 1) cannot overflow
+            np.clip(self._mix, -32768, 32767, out=self._mix)
+        np.copyto(self._out, self._mix, casting='unsafe')
+        return self._out.tobytes()
+
+    def _mix_outgoing(self):
+        outgoing = self._fade_source.read()
+        if len(outgoing) == FRAME_SIZE:
+            ramp = self._fill_ramp(1 - self._fade_done / self._fade_total, 1 - (self._fade_done + 1) / self._fade_total)
+            np.multiply(np.frombuffer(outgoing, dtype=np.int16).reshape(-1, 2), ramp[:, None], out=self._scratch.reshape(-1, 2), casting='unsafe')
+            self._mix += self._scratch
+        self._fade_done += 1
+        if len(outgoing) != FRAME_SIZE or self._fade_done >= self._fade_total:
+            self._drop_fade()
+
+
+class PositionTracker(discord.AudioSource):
+    """Outermost source handed to the voice client. Counts the frames discord actually reads,
+    so `elapsed` is exact (pauses included) and costs one integer increment per frame.
+
+    `swap` replaces the wrapped source without going through VoiceClient.source. The old source is
+    cleaned up on the audio thread right before the first read of the new one, so it is never
+    killed in the middle of a read.
+
+    `queue_next` lines up the following track: when the current source runs out (or on `advance`),
+    the tracker switches to it within the same read, so discord never sees the end of the stream.
+    `on_gap` receives the seconds between the last frame of one source and the first of the next,
+    `on_first_frame` the perf_counter() of the very first frame.
+
+    discord.py only creates the voice client's Opus encoder when play() starts on a PCM source, so a
+    stream that started on Opus can never continue with PCM; check `accepts` before queueing a source.
+    """
+
+    def __init__(self, original, *, offset=0.0, previous_end=None, on_gap=None, on_first_frame=None):
+        self.original = original
+        self.offset = offset # Position of the first frame of `original`, in seconds
+        self.frames = 0
+        self.ended_at = None # perf_counter() when the stream ran out
+        self.on_gap = on_gap
+        self.on_first_frame = on_first_frame
+        self.started_on_pcm = not original.is_opus() # Whether the voice client has an encoder for PCM sources
+        self._previous_end = previous_end # End of the track before this one, for the gap metric
+        self._pending = None # (source, offset, cleanup_old) waiting to be switched to
+        self._next = None # (source, accept, on_advance) to continue with once `original` ends
+        self._advance = False
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return self.offset + self.frames * FRAME_DURATION
+
+    def swap(self, source, *, offset=0.0, cleanup_old=True):
+        with self._lock:
+            if self._pending is not None: # Superseded before the audio thread picked it up
+                self._pending[0].cleanup()
+            self._pending = (source, offset, cleanup_old)
+
+    def accepts(self, source):
+        """Whether `source` can be switched to without a new VoiceClient.play()."""
+        return self.started_on_pcm or source.is_opus()
+
+    def queue_next(self, source, *, accept=None, on_advance=None):
+        """Continues with `source` once the current one ends, if `accept()` (checked then) is still true.
+        `on_advance` is called on the audio thread after switching.
+        """
+        with self._lock:
+            if self._next is not None:
+                self._next[0].cleanup()
+            self._next = (source, accept, on_advance)
+
+    def drop_next(self):
+        """Discards the source lined up with `queue_next`, if the audio thread has not switched to it yet."""
+        with self._lock:
+            upcoming, self._next = self._next, None
+        if upcoming is not None:
+            upcoming[0].cleanup()
+
+    def has_next(self):
+        return self._next is not None
+
+    def advance(self):
+        """Switches to the queued next source on the next read, as if the current one had ended."""
+        self._advance = True
+
+    def read(self):
+        if self._pending is not None:
+            with self._lock:
+                source, offset, cleanup_old = self._pending
+                self._pending = None
+            if cleanup_old:
+                self.original.cleanup()
+            self.original, self.offset, self.frames = source, offset, 0
+        data = b'' if self._advance else self.original.read()
+        if not data and self._next is not None:
+            data = self._continue_with_next()
+        if data:
+            if not self.frames:
+                self._started()
+            self.frames += 1
+        else:
+            self.ended_at = time.perf_counter()
+        return data
+
+    def _started(self):
+        now = time.perf_counter()
+        if self._previous_end is not None:
+            if self.on_gap:
+                self.on_gap(now - self._previous_end)
+            self._previous_end = None
+        if self.on_first_frame is not None:
+            callback, self.on_first_frame = self.on_first_frame, None
+            callback(now)
+
+    def _continue_with_next(self):
+        self._advance = False
+        with self._lock:
+            source, accept, on_advance = self._next
+            self._next = None
+        if (accept is not None and not accept()) or not self.accepts(source):
+            source.cleanup()
+            return b''
+        self._previous_end = time.perf_counter()
+        self.original.cleanup()
+        self.original, self.offset, self.frames = source, 0.0, 0
+        if on_advance is not None:
+            on_advance()
+        return self.original.read()
+
+    def is_opus(self):
+        return self.original.is_opus()
+
+    def cleanup(self):
+        with self._lock:
+            pending, self._pending = self._pending, None
+            upcoming, self._next = self._next, None
+        for queued in (pending, upcoming):
+            if queued is not None:
+                queued[0].cleanup()
+        self.original.cleanup()
+
+
+class PrebufferedSource(discord.AudioSource):
+    """Reads the first frames of a source ahead of time (blocking; run it in an executor), so that
+    ffmpeg has connected and probed before playback needs the audio. The frames are replayed first.
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self._buffer = deque()
+
+    def fill(self, frames):
+        """Reads up to `frames` frames. Returns how many were buffered; 0 means the source is dead."""
+        while len(self._buffer) < frames:
+            data = self.original.read()
+            if not data:
+                break
+            self._buffer.append(data)
+        return len(self._buffer)
+
+    def read(self):
+        if self._buffer:
+            return self._buffer.popleft()
+        return self.original.read()
+
+    def is_opus(self):
+        return self.original.is_opus()
+
+    def cleanup(self):
+        self._buffer.clear()
+        self.original.cleanup()
+
+
+class _LegacyVolumeTransformer(discord.PCMVolumeTransformer):
+    supports_crossfade = False
+
+
+VolumeTransformer = NumpyVolumeTransformer if np is not None else _LegacyVolumeTransformer
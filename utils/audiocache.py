@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import Counter
+
+CACHE_DIR = "audio_cache"
+INDEX_FILE = "index.json"
+MAX_TRACKED_PLAYS = 10000 # Play counts kept for tracks that are not (yet) cached
+INDEX_SAVE_DELAY = 60 # Seconds play counts may wait before the index is rewritten; stores and evictions save at once
+
+_SAFE_ID_RE = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+class AudioCache:
+    """On-disk cache of Ogg/Opus files for tracks played at least `min_plays` times.
+
+    The files are capped at `max_bytes` in total; when over budget, the least played file goes first,
+    the least recently played among equals. Files and the index are written under a temporary name
+    and renamed into place, so a crash never leaves a truncated file or index behind.
+    """
+
+    def __init__(self, path=CACHE_DIR, *, max_bytes, min_plays=3, bitrate=128):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.min_plays = max(1, min_plays)
+        self.bitrate = bitrate
+        self._files = {} # video id -> {'size': bytes, 'plays': n, 'last_used': unix time}
+        self._plays = Counter() # video id -> plays so far, for tracks not cached yet
+        self._storing = {} # video id -> transcode task
+        self._transcode_slot = asyncio.Semaphore(1) # One download at a time, playback bandwidth comes first
+        self._save_timer = None # asyncio.TimerHandle of the pending debounced index save
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        self._load_index()
+
+    def _file(self, video_id):
+        return os.path.join(self.path, f"{video_id}.ogg")
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.path, INDEX_FILE)) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {}
+        except (OSError, ValueError) as e:
+            print(f"Audio cache index unreadable, starting empty: {e}")
+            index = {}
+        self._plays.update(index.get('plays', {}))
+        for video_id, entry in index.get('files', {}).items():
+            try: # Only trust entries whose file is still there and complete
+                if os.path.getsize(self._file(video_id)) == entry['size']:
+                    self._files[video_id] = entry
+            except (OSError, KeyError, TypeError):
+                pass
+        for name in os.listdir(self.path): # Leftovers of interrupted writes or dropped entries
+            video_id, ext = os.path.splitext(name)
+            if ext == '.part' or (ext == '.ogg' and video_id not in self._files):
+                try: os.remove(os.path.join(self.path, name))
+                except OSError: pass
+        self._evict()
+
+    def _save_index(self):
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        temp = os.path.join(self.path, INDEX_FILE + '.part')
+        with open(temp, 'w') as f:
+            json.dump({'files': self._files, 'plays': dict(self._plays)}, f, separators=(',', ':'))
+        os.replace(temp, os.path.join(self.path, INDEX_FILE))
+
+    def path_for(self, video_id):
+        """Returns the cached file for a video id, or None."""
+        entry = self._files.get(video_id)
+        if entry is None:
+            return None
+        entry['last_used'] = time.time()
+        return self._file(video_id)
+
+    def record_play(self, track):
+        """Counts a play and starts caching the track in the background once it is played often enough."""
+        video_id = track.id
+        if not video_id or not _SAFE_ID_RE.fullmatch(video_id) or track.is_live: # Live streams never end
+            return
+        entry = self._files.get(video_id)
+        if entry is not None:
+            self.hits += 1
+            entry['plays'] += 1
+            entry['last_used'] = time.time()
+        else:
+            self.misses += 1
+            self._plays[video_id] += 1
+            if len(self._plays) > MAX_TRACKED_PLAYS:
+                for stale, _ in self._plays.most_common()[MAX_TRACKED_PLAYS // 2:]:
+                    del self._plays[stale]
+            if self._plays[video_id] >= self.min_plays and track.stream_url and video_id not in self._storing:
+                task = asyncio.get_running_loop().create_task(self._store(track, track.stream_url))
+                self._storing[video_id] = task
+                task.add_done_callback(lambda _: self._storing.pop(video_id, None))
+        self._schedule_save()
+
+    def _schedule_save(self):
+        """Saves the index INDEX_SAVE_DELAY seconds from now, batching the play counts recorded until then."""
+        if self._save_timer is None:
+            self._save_timer = asyncio.get_running_loop().call_later(INDEX_SAVE_DELAY, self._save_index)
+
+    async def _store(self, track, stream_url):
+        final = self._file(track.id)
+        temp = final + '.part'
+        # Opus streams are remuxed as-is; anything else is encoded once so cache hits can use Opus passthrough
+        codec = ['-c:a', 'copy'] if track.acodec in ('opus', 'libopus') else ['-c:a', 'libopus', '-b:a', f'{self.bitrate}k']
+        async with self._transcode_slot:
+            process = await asyncio.create_subprocess_exec(
+                'ffmpeg', '-nostdin', '-loglevel', 'error', '-y',
+                '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+                '-i', stream_url, '-vn', *codec, '-f', 'ogg', temp,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                self._discard(temp)
+                raise
+        if process.returncode != 0:
+            print(f"Audio cache: could not store '{track.title}': {stderr.decode(errors='replace').strip()}")
+            self._discard(temp)
+            return
+        size = os.path.getsize(temp)
+        if size > self.max_bytes:
+            self._discard(temp)
+            return
+        os.replace(temp, final)
+        self._files[track.id] = {'size': size, 'plays': self._plays.pop(track.id, self.min_plays), 'last_used': time.time()}
+        self._evict(keep=track.id)
+        self._save_index()
+        print(f"Audio cache: stored '{track.title}' ({size // 1024} KiB)")
+
+    @staticmethod
+    def _discard(path):
+        try: os.remove(path)
+        except OSError: pass
+
+    def _evict(self, keep=None):
+        total = self.size()
+        while total > self.max_bytes:
+            candidates = [video_id for video_id in self._files if video_id != keep]
+            if not candidates:
+                return
+            victim = min(candidates, key=lambda video_id: (self._files[video_id]['plays'], self._files[video_id]['last_used']))
+            total -= self._files.pop(victim)['size']
+            self._discard(self._file(victim))
+
+    def size(self):
+        return sum(entry['size'] for entry in self._files.values())
+
+    def stats(self):
+        return {
+            'files': len(self._files),
+            'bytes': self.size(),
+            'max_bytes': self.max_bytes,
+            'storing': len(self._storing),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def close(self):
+        for task in list(self._storing.values()):
+            task.cancel()
+        self._save_index()
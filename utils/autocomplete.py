@@ -0,0 +1,98 @@
+import bisect
+import re
+import time
+from collections import OrderedDict
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+MAX_KEY_LENGTH = 48
+
+
+def normalize_title(text):
+    return ' '.join(_NON_WORD_RE.sub(' ', text.casefold()).split())
+
+
+class TitleIndex:
+    """Prefix index over track titles for autocomplete.
+    Each title is keyed from the start of every word, so "gonna give" finds "Never Gonna Give You Up".
+    Keys live in one sorted list, so a lookup is a bisect plus a short scan. Holds at most `max_titles`;
+    the least recently added title is dropped first.
+    """
+
+    def __init__(self, max_titles=5000):
+        self.max_titles = max_titles
+        self._titles = OrderedDict() # url -> title, least recently added first
+        self._keys = [] # Sorted (key, url)
+
+    @staticmethod
+    def _keys_for(title):
+        normalized = normalize_title(title)
+        starts = [0] + [index + 1 for index, char in enumerate(normalized) if char == ' ']
+        return {normalized[start:start + MAX_KEY_LENGTH] for start in starts}
+
+    def add(self, title, url):
+        if not title or not url:
+            return
+        if url in self._titles:
+            self._titles.move_to_end(url)
+            return
+        self._titles[url] = title
+        for key in self._keys_for(title):
+            bisect.insort(self._keys, (key, url))
+        self._trim()
+
+    def add_many(self, items):
+        """Adds (title, url) pairs with one sort instead of one insort per key; for bulk loading."""
+        for title, url in items:
+            if not title or not url or url in self._titles:
+                continue
+            self._titles[url] = title
+            self._keys.extend((key, url) for key in self._keys_for(title))
+        self._keys.sort()
+        self._trim()
+
+    def _trim(self):
+        while len(self._titles) > self.max_titles:
+            url, title = self._titles.popitem(last=False)
+            for key in self._keys_for(title):
+                index = bisect.bisect_left(self._keys, (key, url))
+                if index < len(self._keys) and self._keys[index] == (key, url):
+                    del self._keys[index]
+
+    def search(self, prefix, limit=25):
+        """Returns up to `limit` (title, url) pairs matching `prefix`; the most recent titles for an empty prefix."""
+        prefix = normalize_title(prefix)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return [(title, url) for url, title in reversed(self._titles.items())][:limit]
+        results = OrderedDict()
+        index = bisect.bisect_left(self._keys, (prefix,))
+        while index < len(self._keys) and len(results) < limit:
+            key, url = self._keys[index]
+            if not key.startswith(prefix):
+                break
+            results.setdefault(url, self._titles[url])
+            index += 1
+        return [(title, url) for url, title in results.items()]
+
+    def __len__(self):
+        return len(self._titles)
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second on average and bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.rejected = 0
+
+    def try_acquire(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        self.rejected += 1
+        return False
@@ -0,0 +1,121 @@
+import threading
+from collections import deque
+
+import discord
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+RING_FRAMES = 250 # 5s of 20ms frames; a subscriber further behind than this skips ahead
+
+
+class _Broadcast:
+    """One decoder shared by every subscriber of the same source.
+    Frames land in a ring buffer tagged with sequence numbers. Whichever subscriber reaches the
+    newest frame first pulls the next one from the decoder, so the decoder runs at the pace of
+    the fastest listener and never on a thread of its own.
+    """
+
+    def __init__(self, key, source, ring_frames):
+        self.key = key
+        self.source = source
+        self.subscribers = 0
+        self.ended = False
+        self._frames = deque(maxlen=ring_frames)
+        self._next_seq = 0 # Sequence number of the next frame to be decoded
+        self._lock = threading.Lock()
+
+    def head(self):
+        with self._lock:
+            return self._next_seq
+
+    def read_frame(self, cursor):
+        """Returns (frame, next cursor). An empty frame means the source has ended."""
+        with self._lock:
+            oldest = self._next_seq - len(self._frames)
+            if cursor < oldest: # Fell out of the buffer (e.g. paused): skip to the oldest frame still held
+                cursor = oldest
+            if cursor == self._next_seq:
+                if self.ended:
+                    return b'', cursor
+                data = self.source.read()
+                if len(data) != FRAME_SIZE:
+                    self.ended = True
+                    return b'', cursor
+                self._frames.append(data)
+                self._next_seq += 1
+                oldest = self._next_seq - len(self._frames)
+            return self._frames[cursor - oldest], cursor + 1
+
+    def close(self):
+        with self._lock: # Never kill the decoder in the middle of a read
+            self.ended = True
+            self.source.cleanup()
+
+
+class BroadcastSubscriber(discord.AudioSource):
+    """PCM source reading from a shared broadcast. Starts at the live edge; cleanup unsubscribes."""
+
+    def __init__(self, registry, broadcast):
+        self._registry = registry
+        self._broadcast = broadcast
+        self._cursor = broadcast.head()
+        self._closed = False
+
+    def read(self):
+        data, self._cursor = self._broadcast.read_frame(self._cursor)
+        return data
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        if not self._closed:
+            self._closed = True
+            self._registry.release(self._broadcast)
+
+
+class BroadcastRegistry:
+    """Hands out subscribers to shared decoders, keyed by source (e.g. video id).
+    The decoder is started by the first subscriber and cleaned up when the last one leaves.
+    Thread-safe: sources are cleaned up from discord's audio player threads.
+    """
+
+    def __init__(self, *, ring_frames=RING_FRAMES):
+        self.ring_frames = ring_frames
+        self._broadcasts = {} # key -> _Broadcast
+        self._lock = threading.Lock()
+        self.started = 0
+
+    def subscribe(self, key, source_factory):
+        """Returns a new subscriber for `key`, calling `source_factory()` if nothing is decoding it yet."""
+        with self._lock:
+            broadcast = self._broadcasts.get(key)
+            if broadcast is None or broadcast.ended:
+                broadcast = _Broadcast(key, source_factory(), self.ring_frames)
+                self._broadcasts[key] = broadcast
+                self.started += 1
+            broadcast.subscribers += 1
+            return BroadcastSubscriber(self, broadcast)
+
+    def release(self, broadcast):
+        with self._lock:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers > 0:
+                return
+            if self._broadcasts.get(broadcast.key) is broadcast:
+                del self._broadcasts[broadcast.key]
+        broadcast.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'broadcasts': len(self._broadcasts),
+                'listeners': sum(broadcast.subscribers for broadcast in self._broadcasts.values()),
+                'started': self.started,
+            }
+
+    def close(self):
+        with self._lock:
+            broadcasts = list(self._broadcasts.values())
+            self._broadcasts.clear()
+        for broadcast in broadcasts:
+            broadcast.close()
@@ -0,0 +1,198 @@
+import ast
+import asyncio
+import importlib
+import os
+import sys
+import time
+
+from discord.ext import commands
+
+META_NAME = "COG_META"
+
+
+def read_meta(path):
+    """Reads a cog's optional module-level COG_META dict without importing the cog.
+    Keys: 'depends', names of cogs that must be loaded first, and 'lazy', to load the cog
+    in the background while the bot connects instead of before.
+    """
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == META_NAME for target in node.targets):
+            return dict(ast.literal_eval(node.value))
+    return {}
+
+
+def read_imports(path):
+    """Names of the modules a cog imports at module level (absolute imports only), without importing it.
+    For `from x import y`, y is listed as x.y; it may be an attribute rather than a submodule.
+    """
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.append(node.module)
+            modules.extend(f"{node.module}.{alias.name}" for alias in node.names if alias.name != '*')
+    return modules
+
+
+def import_dependencies(path):
+    """Imports what a cog imports, so that loading the cog itself only has to run its own module body.
+    Errors are left for load_extension to report.
+    """
+    for module in read_imports(path):
+        parent, _, attribute = module.rpartition('.')
+        if parent and parent in sys.modules and hasattr(sys.modules[parent], attribute):
+            continue # An attribute of a module already imported, e.g. `from typing import List`
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+
+class CogLoader:
+    """Loads the cogs of a directory concurrently, each one after the cogs it depends on.
+
+    The modules a cog imports are imported in a worker thread first, so heavy imports of independent
+    cogs overlap and stay off the event loop; `load_extension` then runs the cog module (once) and
+    its setup. The profile's 'import' is that worker-thread import (a module shared by several cogs is
+    counted for whichever imports it first), 'setup' is load_extension. Eager cogs are loaded before
+    the bot starts, lazy ones in the background; a cog an eager cog depends on is always eager.
+    """
+
+    def __init__(self, bot, directory='cogs'):
+        self.bot = bot
+        self.directory = directory
+        self.meta = {} # cog name -> COG_META
+        self.profile = {} # cog name -> {'lazy', 'import', 'setup', 'error'}; times in seconds
+        self.phases = {} # 'eager' / 'lazy' -> wall-clock seconds to load that group
+        self._tasks = {} # cog name -> load task
+        self._lazy_task = None
+
+    def discover(self):
+        """Finds the cogs and reads their metadata. Cogs with unknown or circular dependencies are
+        recorded as failed instead of loaded.
+        """
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith('.py') or filename == '__init__.py':
+                continue
+            name = filename[:-3]
+            try:
+                meta = read_meta(os.path.join(self.directory, filename))
+            except (SyntaxError, ValueError) as e:
+                print(f"Invalid {META_NAME} in cog {name}, loading it eagerly without dependencies: {e}")
+                meta = {}
+            self.meta[name] = {'depends': list(meta.get('depends', [])), 'lazy': bool(meta.get('lazy', False))}
+            self.profile[name] = {'lazy': self.meta[name]['lazy'], 'import': None, 'setup': None, 'error': None}
+
+        for name in self.meta:
+            missing = [dependency for dependency in self.meta[name]['depends'] if dependency not in self.meta]
+            if missing:
+                self.profile[name]['error'] = f"unknown dependency: {', '.join(missing)}"
+            elif self._in_cycle(name):
+                self.profile[name]['error'] = "circular dependency"
+
+        eager = [name for name in self.meta if not self.meta[name]['lazy']]
+        while eager:
+            for dependency in self.meta[eager.pop()]['depends']:
+                if self.meta.get(dependency, {}).get('lazy'):
+                    self.meta[dependency]['lazy'] = self.profile[dependency]['lazy'] = False
+                    eager.append(dependency)
+
+    def _in_cycle(self, start):
+        stack, seen = list(self.meta[start]['depends']), set()
+        while stack:
+            name = stack.pop()
+            if name == start:
+                return True
+            if name in seen or name not in self.meta:
+                continue
+            seen.add(name)
+            stack.extend(self.meta[name]['depends'])
+        return False
+
+    async def load_eager(self):
+        await self._load_all(lazy=False)
+
+    def start_lazy(self):
+        """Starts loading the lazy cogs in the background; `wait_lazy` waits for them."""
+        if self._lazy_task is None:
+            self._lazy_task = asyncio.ensure_future(self._load_all(lazy=True))
+
+    async def wait_lazy(self):
+        self.start_lazy()
+        await asyncio.shield(self._lazy_task)
+
+    async def _load_all(self, *, lazy):
+        started = time.perf_counter()
+        names = [name for name, meta in self.meta.items() if meta['lazy'] == lazy]
+        await asyncio.gather(*(self._task_for(name) for name in names))
+        self.phases['lazy' if lazy else 'eager'] = time.perf_counter() - started
+
+    def _task_for(self, name):
+        task = self._tasks.get(name)
+        if task is None:
+            task = self._tasks[name] = asyncio.ensure_future(self._load(name))
+        return task
+
+    async def _load(self, name):
+        """Loads one cog. Never raises: failures end up in the profile."""
+        profile = self.profile[name]
+        if profile['error']:
+            print(f"Skipping cog {name}: {profile['error']}")
+            return False
+        for dependency in self.meta[name]['depends']:
+            if not await self._task_for(dependency):
+                profile['error'] = f"dependency {dependency} failed to load"
+                print(f"Skipping cog {name}: {profile['error']}")
+                return False
+
+        module = f"{self.directory}.{name}"
+        started = time.perf_counter()
+        path = os.path.join(self.directory, f"{name}.py")
+        await asyncio.get_running_loop().run_in_executor(None, import_dependencies, path)
+        profile['import'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            await self.bot.load_extension(module)
+        except commands.ExtensionNotFound:
+            profile['error'] = "not found"
+            print(f"Cog not found: {name}. Skipping.")
+        except commands.NoEntryPointError:
+            profile['error'] = "no setup function"
+            print(f"Cog {name} does not have a setup function. Skipping.")
+        except commands.ExtensionFailed as e:
+            profile['error'] = f"{type(e.original).__name__}: {e.original}"
+            print(f"Failed to load cog: {name}. Error: {e.original}") # Access original error
+        except Exception as e:
+            profile['error'] = f"{type(e).__name__}: {e}"
+            print(f"An unexpected error occurred loading cog: {name}. Error: {e}")
+        else:
+            profile['setup'] = time.perf_counter() - started
+            print(f"Successfully loaded cog: {name} (import {profile['import'] * 1000:.0f} ms, setup {profile['setup'] * 1000:.0f} ms)")
+            return True
+        return False
+
+    def failures(self):
+        return {name: profile['error'] for name, profile in self.profile.items() if profile['error']}
+
+    def report(self):
+        """The startup profile as plain data, e.g. for json.dumps."""
+        return {
+            'cogs': {
+                name: {
+                    'depends': self.meta[name]['depends'],
+                    'lazy': profile['lazy'],
+                    'import_ms': round(profile['import'] * 1000, 1) if profile['import'] is not None else None,
+                    'setup_ms': round(profile['setup'] * 1000, 1) if profile['setup'] is not None else None,
+                    'error': profile['error'],
+                }
+                for name, profile in self.profile.items()
+            },
+            'phases_ms': {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            'failed': sorted(self.failures()),
+        }
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+
+import discord
+
+HASH_FILE = "command_tree.json"
+
+
+def tree_hash(tree, guild=None):
+    """Stable hash of the payload `tree.sync(guild=guild)` would send, independent of registration order."""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name']),
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class CommandSyncer:
+    """Syncs the application command tree only when it changed since the last successful sync.
+
+    The hash of every synced scope (global, or one development guild) is kept in `path`, so neither
+    gateway reconnects nor restarts without command changes make any REST call. With `dev_guild_ids`,
+    global commands are copied to those guilds and synced there instead, where changes show up at once.
+    """
+
+    def __init__(self, tree, *, path=HASH_FILE, dev_guild_ids=()):
+        self.tree = tree
+        self.path = path
+        self.dev_guild_ids = list(dev_guild_ids)
+        self._hashes = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Command sync state unreadable, syncing everything again: {e}")
+            return {}
+
+    def _save(self):
+        temp = self.path + '.part'
+        with open(temp, 'w') as f:
+            json.dump(self._hashes, f, indent=2, sort_keys=True)
+        os.replace(temp, self.path)
+
+    def _key(self, guild):
+        # Per application, so a different bot token in the same directory still gets its commands
+        scope = f"guild:{guild.id}" if guild else "global"
+        return f"{self.tree.client.application_id}:{scope}"
+
+    async def sync(self, *, force=False):
+        """Syncs every scope whose commands changed. Returns {scope: number of commands synced};
+        empty when nothing had to be sent.
+        """
+        guilds = [discord.Object(id=guild_id) for guild_id in self.dev_guild_ids] or [None]
+        synced = {}
+        for guild in guilds:
+            if guild is not None:
+                self.tree.copy_global_to(guild=guild)
+            key = self._key(guild)
+            digest = tree_hash(self.tree, guild)
+            if not force and self._hashes.get(key) == digest:
+                continue
+            commands = await self.tree.sync(guild=guild)
+            self._hashes[key] = digest # Only recorded once Discord accepted the commands
+            self._save()
+            synced[f"guild {guild.id}" if guild else "global"] = len(commands)
+        return synced
@@ -0,0 +1,327 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from utils.ytcache import META_FIELDS, STREAM_FIELDS, trim_info
+
+# YTDL options
+ytdl_format_options = {
+    'format': 'bestaudio/best',
+    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
+    'restrictfilenames': True,
+    'noplaylist': True,
+    'nocheckcertificate': True,
+    'ignoreerrors': False,
+    'logtostderr': False,
+    'quiet': True,
+    'no_warnings': True,
+    'default_search': 'auto',
+    'source_address': '0.0.0.0',  # bind to ipv4 since ipv6 addresses cause issues sometimes
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'mp3',
+        'preferredquality': '192',
+    }],
+}
+
+# Flat playlist extraction only lists entries (id, title, ...) without resolving any of them
+ytdl_playlist_options = {
+    **ytdl_format_options,
+    'noplaylist': False,
+    'extract_flat': 'in_playlist',
+}
+
+INFO_FIELDS = META_FIELDS + STREAM_FIELDS
+
+_ytdl = None # One YoutubeDL per process; pool workers build theirs in the initializer
+
+
+class ExtractionError(Exception):
+    """yt-dlp could not extract a query. Carries only the message, so it crosses the process pool
+    boundary, and callers can catch it without importing yt-dlp themselves.
+    """
+
+
+def get_ytdl():
+    global _ytdl
+    if _ytdl is None:
+        import yt_dlp
+        # Suppress noise about console usage from errors
+        yt_dlp.utils.bug_reports_message = lambda: ''
+        _ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
+    return _ytdl
+
+
+def _call_ytdl(query):
+    import yt_dlp
+    try:
+        return get_ytdl().extract_info(query, download=False)
+    except yt_dlp.utils.DownloadError as e:
+        # The original carries traceback objects that cannot cross a process boundary
+        raise ExtractionError(str(e)) from None
+
+
+def warm_up_worker(hold=0):
+    """Builds this worker's YoutubeDL, which imports yt-dlp and loads its extractors.
+    `hold` keeps the worker busy for a moment, so the next warm-up call lands on another worker.
+    """
+    get_ytdl()
+    time.sleep(hold)
+
+
+def extract_entry(query):
+    """Extracts a single video (the first entry for playlists/searches), trimmed to INFO_FIELDS.
+    Module-level so it can run in a worker process; only the small trimmed dict is sent back.
+    """
+    data = _call_ytdl(query)
+    if 'entries' in data:
+        # take first item from a playlist
+        data = next(entry for entry in data['entries'] if entry)
+    return trim_info(data, INFO_FIELDS)
+
+
+def extract_search(query, limit):
+    data = _call_ytdl(f"ytsearch{limit}:{query}")
+    return [trim_info(entry, INFO_FIELDS) for entry in data.get('entries', []) if entry]
+
+
+def is_playlist_url(query):
+    """True for links to a whole playlist. Watch links that merely carry a list= parameter play a single video."""
+    parts = urlsplit(query.strip())
+    if parts.scheme not in ('http', 'https'):
+        return False
+    params = parse_qs(parts.query)
+    return 'list' in params and ('v' not in params or parts.path.rstrip('/') == '/playlist')
+
+
+def extract_playlist_page(url, start, count):
+    """Flat-extracts playlist entries [start, start + count).
+    Returns (playlist title, total count or None, number of raw entries seen, usable entries).
+    yt-dlp pages through the playlist lazily, so only the listing pages up to the end of the slice are
+    fetched, but all of those are fetched on every call: list a playlist in few, large slices.
+    """
+    import yt_dlp
+    options = {**ytdl_playlist_options, 'playlist_items': f"{start + 1}:{start + count}"}
+    try:
+        with yt_dlp.YoutubeDL(options) as ytdl:
+            data = ytdl.extract_info(url, download=False)
+    except yt_dlp.utils.DownloadError as e:
+        raise ExtractionError(str(e)) from None
+    raw_entries = list(data.get('entries') or [])
+    entries = []
+    for entry in raw_entries:
+        if not entry or not entry.get('id'):
+            continue
+        thumbnails = entry.get('thumbnails') or []
+        entries.append({
+            'id': entry['id'],
+            'title': entry.get('title') or entry['id'],
+            'webpage_url': entry.get('webpage_url') or entry.get('url'),
+            'duration': entry.get('duration'),
+            'uploader': entry.get('uploader') or entry.get('channel'),
+            'thumbnail': entry.get('thumbnail') or (thumbnails[-1].get('url') if thumbnails else None),
+        })
+    return data.get('title'), data.get('playlist_count'), len(raw_entries), entries
+
+
+def create_executor(max_workers, *, processes=False):
+    """Thread pool by default. With `processes`, a warm pool of worker processes keeps
+    yt-dlp's GIL-heavy parsing off the bot's interpreter entirely.
+    """
+    if not processes:
+        return ThreadPoolExecutor(max_workers, thread_name_prefix="ytdl")
+    # spawn: forking a process that runs an event loop and voice threads is not safe.
+    # Workers are started by ExtractionScheduler.warm_up (or the first job), not here.
+    return ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"), initializer=get_ytdl)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key, so the underlying work runs only once.
+    Late callers await the future of the call already in flight.
+    """
+
+    def __init__(self):
+        self._inflight = {} # key -> asyncio.Future
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, coro_factory):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._release(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # Shielded: one caller giving up must not cancel the work for everyone else
+        return await asyncio.shield(future)
+
+    def _release(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception() # Mark as retrieved even if every waiter was cancelled
+
+    def __len__(self):
+        return len(self._inflight)
+
+
+# Priority classes, most urgent first
+PRIORITY_PLAY = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_AUTOPLAY = 2
+PRIORITY_SUGGEST = 3
+PRIORITY_NAMES = ('play', 'prefetch', 'autoplay', 'suggest')
+
+# Share of `max_pending` each class may fill before new work of that class is refused,
+# so background work is shed long before interactive requests are.
+PENDING_SHARE = (1.0, 0.75, 0.5, 0.5)
+
+
+class SchedulerSaturated(Exception):
+    """Raised when the extraction queue is too deep to accept a job."""
+
+
+class _Job:
+    __slots__ = ('fn', 'guild_id', 'future', 'queued_at')
+
+    def __init__(self, fn, guild_id, future):
+        self.fn = fn
+        self.guild_id = guild_id
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class ExtractionScheduler:
+    """Bounded, prioritized executor for blocking yt-dlp calls.
+
+    At most `max_workers` jobs run at once, and at most `per_guild_running` of them for one guild,
+    so a single busy guild cannot monopolize the pool. A guild may also have at most
+    `per_guild_pending` jobs waiting. Jobs are picked strictly by priority class, FIFO within a class.
+    """
+
+    def __init__(self, *, max_workers=4, max_pending=32, per_guild_running=2, per_guild_pending=8, executor=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.per_guild_running = per_guild_running
+        self.per_guild_pending = per_guild_pending
+        self._executor = executor or create_executor(max_workers)
+        self._pending = [deque() for _ in PRIORITY_NAMES]
+        self._pending_by_guild = Counter()
+        self._running = 0
+        self._running_by_guild = Counter()
+        self.stats = [{'jobs': 0, 'rejected': 0, 'wait': 0.0, 'max_wait': 0.0, 'run': 0.0} for _ in PRIORITY_NAMES]
+
+    @property
+    def running(self):
+        return self._running
+
+    def pending_count(self):
+        return sum(len(queue) for queue in self._pending)
+
+    async def submit(self, fn, *, priority=PRIORITY_PLAY, guild_id=None):
+        """Runs `fn()` in the extraction pool and returns its result."""
+        if self.pending_count() >= self.max_pending * PENDING_SHARE[priority] or (
+            guild_id is not None and self._pending_by_guild[guild_id] >= self.per_guild_pending
+        ):
+            self.stats[priority]['rejected'] += 1
+            raise SchedulerSaturated(f"Extraction queue is full ({self.pending_count()} waiting, {self._running} running).")
+
+        job = _Job(fn, guild_id, asyncio.get_running_loop().create_future())
+        self._pending[priority].append(job)
+        if guild_id is not None:
+            self._pending_by_guild[guild_id] += 1
+        self._dispatch()
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            self._withdraw(priority, job)
+            raise
+
+    def _withdraw(self, priority, job):
+        """Drops a job whose caller gave up before it started, so it stops counting as pending."""
+        try:
+            self._pending[priority].remove(job)
+        except ValueError:
+            return # Already started; _finished cleans up once the work is done
+        if job.guild_id is not None:
+            self._pending_by_guild[job.guild_id] -= 1
+
+    def _next_job(self):
+        for priority, queue in enumerate(self._pending):
+            for index, job in enumerate(queue):
+                if job.guild_id is None or self._running_by_guild[job.guild_id] < self.per_guild_running:
+                    del queue[index]
+                    if job.guild_id is not None:
+                        self._pending_by_guild[job.guild_id] -= 1
+                    return priority, job
+        return None, None
+
+    def _dispatch(self):
+        while self._running < self.max_workers:
+            priority, job = self._next_job()
+            if job is None:
+                return
+            if job.future.cancelled(): # Cancelled without the caller's task noticing yet
+                continue
+            started_at = time.perf_counter()
+            wait = started_at - job.queued_at
+            stats = self.stats[priority]
+            stats['jobs'] += 1
+            stats['wait'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+
+            self._running += 1
+            if job.guild_id is not None:
+                self._running_by_guild[job.guild_id] += 1
+            work = asyncio.get_running_loop().run_in_executor(self._executor, job.fn)
+            work.add_done_callback(functools.partial(self._finished, priority, job, started_at))
+
+    def _finished(self, priority, job, started_at, work):
+        self.stats[priority]['run'] += time.perf_counter() - started_at
+        self._running -= 1
+        if job.guild_id is not None:
+            self._running_by_guild[job.guild_id] -= 1
+            if not self._running_by_guild[job.guild_id]:
+                del self._running_by_guild[job.guild_id]
+        if job.future.cancelled():
+            if not work.cancelled():
+                work.exception() # Nobody is waiting for it; mark it as retrieved
+        elif work.cancelled(): # Pool shut down underneath us
+            job.future.cancel()
+        else:
+            if work.exception() is not None:
+                job.future.set_exception(work.exception())
+            else:
+                job.future.set_result(work.result())
+        self._dispatch()
+
+    async def warm_up(self):
+        """Imports yt-dlp and builds the YoutubeDL instances ahead of the first request.
+        Processes each need their own instance (built by the pool initializer); threads share one.
+        """
+        loop = asyncio.get_running_loop()
+        if isinstance(self._executor, ProcessPoolExecutor):
+            calls = [functools.partial(warm_up_worker, 0.2) for _ in range(self.max_workers)]
+        else:
+            calls = [warm_up_worker]
+        await asyncio.gather(*(loop.run_in_executor(self._executor, call) for call in calls))
+
+    def summary(self):
+        """One line per priority class: job count, average/max queue wait and average run time."""
+        lines = []
+        for name, stats in zip(PRIORITY_NAMES, self.stats):
+            jobs = stats['jobs'] or 1
+            lines.append(
+                f"{name}: {stats['jobs']} jobs, wait {stats['wait'] / jobs:.2f}s avg / {stats['max_wait']:.2f}s max, "
+                f"run {stats['run'] / jobs:.2f}s avg, {stats['rejected']} rejected"
+            )
+        return lines
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,140 @@
+import asyncio
+import os
+
+GIT_TIMEOUT = 15 # Seconds before a git command is killed
+
+
+class GitError(Exception):
+    """A git command failed or timed out. `output` holds what git printed."""
+
+    def __init__(self, message, output=''):
+        super().__init__(message)
+        self.output = output
+
+
+class GitService:
+    """Runs git as an asyncio subprocess, so the event loop (and with it voice and heartbeats) never
+    waits on it. Version details and the tag list are cached until HEAD or a ref changes; that is
+    checked by stat-ing HEAD, the current branch, packed-refs and the tag files under .git, without running git.
+    """
+
+    def __init__(self, repo_path=".", *, timeout=GIT_TIMEOUT):
+        self.repo_path = repo_path
+        self.timeout = timeout
+        self._git_dir = None
+        self._common_dir = None # Holds refs and packed-refs; differs from the git dir in worktrees
+        self._cache = {} # name -> (refs fingerprint, value)
+
+    async def run(self, *args, timeout=None):
+        """Returns git's stdout. Raises GitError on a non-zero exit or timeout, FileNotFoundError without git."""
+        process = await asyncio.create_subprocess_exec(
+            'git', *args, cwd=self.repo_path,
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise GitError(f"git {args[0]} timed out after {timeout or self.timeout}s") from None
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait() # Reap it, or it lingers as a zombie and its transport is never closed
+            raise
+        text = output.decode(errors='replace')
+        if process.returncode != 0:
+            raise GitError(f"git {args[0]} exited with status {process.returncode}", text.strip())
+        return text
+
+    async def _refs_fingerprint(self):
+        if self._git_dir is None:
+            git_dir, common_dir = (await self.run('rev-parse', '--git-dir', '--git-common-dir')).splitlines()
+            self._git_dir = os.path.join(self.repo_path, git_dir)
+            self._common_dir = os.path.join(self.repo_path, common_dir)
+        paths = [
+            os.path.join(self._git_dir, 'HEAD'),
+            os.path.join(self._common_dir, 'packed-refs'),
+        ]
+        try:
+            with open(paths[0]) as f:
+                head = f.read().strip()
+        except OSError:
+            head = ''
+        if head.startswith('ref: '): # On a branch: its ref file moves with every commit
+            paths.append(os.path.join(self._common_dir, head[5:]))
+        fingerprint = [head]
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                fingerprint.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                fingerprint.append(None)
+        fingerprint.append(self._loose_tags_fingerprint())
+        return tuple(fingerprint)
+
+    def _loose_tags_fingerprint(self):
+        """Every directory and file under refs/tags with its mtime and size. Catches tags added or deleted in
+        nested directories (release/v1), which only change their own directory, and force-updated tags, which
+        rewrite their file but leave the directories alone.
+        """
+        fingerprint = []
+        for directory, _, files in os.walk(os.path.join(self._common_dir, 'refs', 'tags')):
+            for path in [directory, *(os.path.join(directory, name) for name in files)]:
+                try:
+                    stat = os.stat(path)
+                except OSError: # Deleted while walking; the next check sees the result
+                    continue
+                fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(fingerprint))
+
+    async def _cached(self, name, load):
+        fingerprint = await self._refs_fingerprint()
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        value = await load()
+        self._cache[name] = (fingerprint, value)
+        return value
+
+    def invalidate(self):
+        self._cache.clear()
+
+    async def version_info(self):
+        """{'branch', 'commit', 'tags', 'last_commit', 'committed_at'} of HEAD; committed_at is a Unix time,
+        so relative dates are rendered when shown rather than going stale in the cache.
+        """
+        return await self._cached('version', self._load_version_info)
+
+    async def _load_version_info(self):
+        branch, commit, tags, last_commit = await asyncio.gather(
+            self.run('rev-parse', '--abbrev-ref', 'HEAD'),
+            self.run('rev-parse', '--short', 'HEAD'),
+            self.run('tag', '--points-at', 'HEAD'),
+            self.run('log', '-1', '--pretty=format:%ct %h %an : %s'),
+        )
+        committed_at, last_commit = last_commit.strip().split(' ', 1)
+        return {
+            'branch': branch.strip(),
+            'commit': commit.strip(),
+            'tags': tags.split(),
+            'last_commit': last_commit,
+            'committed_at': int(committed_at),
+        }
+
+    async def tags(self):
+        """Every local tag, in git's order."""
+        return await self._cached('tags', self._load_tags)
+
+    async def _load_tags(self):
+        return (await self.run('tag')).split()
+
+    async def ref_exists(self, ref):
+        try:
+            await self.run('rev-parse', '--verify', '--quiet', '--end-of-options', f'{ref}^{{commit}}')
+        except GitError:
+            return False
+        return True
+
+    async def create_tag(self, name):
+        await self.run('tag', '--end-of-options', name)
+        self.invalidate()
@@ -0,0 +1,143 @@
+import os
+import re
+import time
+from datetime import datetime
+
+BLOCK_SIZE = 64 * 1024 # Bytes read per step when scanning backwards
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIMESTAMP_RE = re.compile(rb'^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] ')
+_DURATION_RE = re.compile(r'(\d+)([smhdw])')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# The bot logs with print, so levels are recognised by the words its messages use
+ERROR_WORDS = ('error', 'exception', 'traceback', 'failed', 'critical')
+LEVEL_WORDS = {
+    'error': ERROR_WORDS,
+    'warning': ERROR_WORDS + ('warning', 'warn', 'could not', 'stale'),
+}
+
+
+class TimestampedStream:
+    """Wraps a text stream so every line written to it starts with the time it was written,
+    in the same "[YYYY-MM-DD HH:MM:SS] " form the bot manager uses. LogReader relies on it for --since.
+    The stream is switched to line buffering, so lines reach the file in the order they were stamped
+    even when stdout and stderr share it.
+    """
+
+    def __init__(self, stream):
+        if hasattr(stream, 'reconfigure'):
+            stream.reconfigure(line_buffering=True)
+        self._stream = stream
+        self._at_line_start = True
+
+    def write(self, text):
+        stamp = time.strftime(f"[{TIMESTAMP_FORMAT}] ")
+        parts = []
+        for line in re.findall(r'[^\n]*\n|[^\n]+', text):
+            if self._at_line_start:
+                parts.append(stamp)
+            parts.append(line)
+            self._at_line_start = line.endswith('\n')
+        self._stream.write(''.join(parts))
+        return len(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def line_time(line):
+    """Unix time of a timestamped log line (bytes), or None for lines without one."""
+    match = TIMESTAMP_RE.match(line)
+    if match is None:
+        return None
+    stamp = match.group(1) # Sliced rather than strptime'd: this runs for every line a query scans
+    try:
+        return time.mktime((
+            int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]), int(stamp[11:13]), int(stamp[14:16]), int(stamp[17:19]), 0, 0, -1,
+        ))
+    except (OverflowError, ValueError):
+        return None
+
+
+def parse_since(text, now=None):
+    """Parses a duration back from now ("90m", "2h", "1d12h") or a local date/time ("2024-05-01",
+    "2024-05-01T13:00", "2024-05-01T13:00:05") into a Unix time. Returns None if it is neither.
+    """
+    text = text.strip().lower()
+    if text and _DURATION_RE.sub('', text) == '':
+        seconds = sum(int(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_RE.findall(text))
+        return (now if now is not None else time.time()) - seconds
+    for pattern in ("%Y-%m-%dt%H:%M:%S", "%Y-%m-%dt%H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, pattern).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+class LogReader:
+    """Reads the end of a large, append-only log without loading it.
+
+    `tail` walks the file backwards in BLOCK_SIZE blocks and stops as soon as it has enough matching
+    lines, so its cost depends on the lines returned (and skipped by filters), not on the file size.
+    A `since` query also stops at the first line older than `since`, so it never reads further back
+    than the window it asks for. Keeps no state between queries, so they can run in an executor.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def tail(self, count, *, since=None, level=None, keyword=None):
+        """Returns up to `count` of the newest lines (oldest first) matching every given filter.
+        A line without a timestamp belongs to the timestamped line before it (e.g. traceback lines),
+        and is kept or dropped along with it.
+        """
+        words = LEVEL_WORDS.get(level) if level else None
+        keyword = keyword.casefold() if keyword else None
+        with open(self.path, 'rb') as f:
+            end = os.fstat(f.fileno()).st_size
+            found = []
+            continuation = [] # Lines after the most recent timestamped line seen, newest first
+            for line in self._reverse_lines(f, end):
+                stamp = line_time(line)
+                if stamp is None:
+                    continuation.append(line)
+                    continue
+                if since is not None and stamp < since:
+                    continuation = []
+                    break
+                entry = [line] + continuation[::-1]
+                continuation = []
+                if self._matches(entry, words, keyword):
+                    found.extend(reversed(entry))
+                    if len(found) >= count:
+                        break
+            if continuation and since is None and self._matches(continuation[::-1], words, keyword):
+                found.extend(continuation) # Lines from before timestamps were written
+        return [line.decode('utf-8', errors='replace') for line in reversed(found[:count])]
+
+    @staticmethod
+    def _matches(entry, words, keyword):
+        if words is None and keyword is None:
+            return True
+        text = b'\n'.join(entry).decode('utf-8', errors='replace').casefold()
+        if words is not None and not any(word in text for word in words):
+            return False
+        return keyword is None or keyword in text
+
+    @staticmethod
+    def _reverse_lines(f, end):
+        """Yields the non-empty lines before offset `end`, newest first."""
+        position = end
+        remainder = b''
+        while position > 0:
+            size = min(BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b'\n')
+            remainder = lines.pop(0) # Possibly cut off; completed by the next, earlier block
+            for line in reversed(lines):
+                if line:
+                    yield line.rstrip(b'\r')
+        if remainder:
+            yield remainder.rstrip(b'\r')
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from collections import deque
+
+
+class LoopLagMonitor:
+    """Measures event loop lag: how much later than requested a short sleep wakes up.
+    Sustained lag means something is holding the loop (or the GIL), which delays heartbeats and voice packets.
+    """
+
+    def __init__(self, interval=0.25, window=240):
+        self.interval = interval
+        self.samples = deque(maxlen=window) # Last `window` lag samples in seconds
+        self.worst = 0.0
+        self._task = None
+
+    def start(self, loop):
+        self._task = loop.create_task(self._run(loop))
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def _run(self, loop):
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            self.worst = max(self.worst, lag)
+
+    def summary(self):
+        if not self.samples:
+            return "No samples yet."
+        ordered = sorted(self.samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return (
+            f"avg {sum(ordered) / len(ordered) * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms, "
+            f"max {ordered[-1] * 1000:.1f}ms (last {len(ordered) * self.interval:.0f}s), "
+            f"worst since start {self.worst * 1000:.1f}ms"
+        )
+
+
+class LatencyStats:
+    """Rolling window of durations (e.g. gaps between tracks). `add` is safe to call from any thread."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return "No samples yet."
+        ordered = sorted(self.samples)
+        p50 = ordered[len(ordered) // 2]
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (
+            f"p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, max {ordered[-1] * 1000:.0f}ms "
+            f"(last {len(ordered)} of {self.count})"
+        )
+
+
+# codec_probe is the player's own codec check; ffmpeg's input probing happens after spawning and counts towards first_frame
+STARTUP_STAGES = ('extract', 'codec_probe', 'spawn', 'first_frame', 'total')
+
+
+class StartupStats:
+    """Time-to-first-audio per play, split into stages, plus the total per input profile.
+    `add` runs on the audio thread, so profiles are read through `profiles`.
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self.stages = {stage: LatencyStats(window) for stage in STARTUP_STAGES}
+        self.by_profile = {} # profile label -> LatencyStats of totals
+        self._lock = threading.Lock()
+
+    def add(self, timings, profile):
+        for stage in STARTUP_STAGES:
+            self.stages[stage].add(timings.get(stage, 0.0))
+        with self._lock:
+            stats = self.by_profile.setdefault(profile, LatencyStats(self.window))
+        stats.add(timings.get('total', 0.0))
+
+    def profiles(self):
+        """[(profile label, LatencyStats of totals)], sorted by label."""
+        with self._lock:
+            return sorted(self.by_profile.items())
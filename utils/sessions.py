@@ -0,0 +1,54 @@
+import json
+import sqlite3
+import time
+
+SESSION_FILE = "sessions.sqlite3"
+
+
+class SessionStore:
+    """Per-guild playback sessions (voice channel, current track, position, settings and queue) in SQLite,
+    so they survive a restart. Settings and queue are separate rows: the small settings row is rewritten
+    on every snapshot, the queue only when it changed.
+    """
+
+    def __init__(self, path=SESSION_FILE):
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (guild_id INTEGER PRIMARY KEY, updated REAL NOT NULL, state TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS queues (guild_id INTEGER PRIMARY KEY, tracks TEXT NOT NULL)")
+
+    def save(self, guild_id, state, queue=None):
+        """Stores a session. `queue` (a list of compact tracks) is left as stored when None."""
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (guild_id, updated, state) VALUES (?, ?, ?)",
+                (guild_id, time.time(), json.dumps(state, separators=(',', ':'))),
+            )
+            if queue is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO queues (guild_id, tracks) VALUES (?, ?)",
+                    (guild_id, json.dumps(queue, separators=(',', ':'))),
+                )
+
+    def delete(self, guild_id):
+        with self._db:
+            self._db.execute("DELETE FROM sessions WHERE guild_id = ?", (guild_id,))
+            self._db.execute("DELETE FROM queues WHERE guild_id = ?", (guild_id,))
+
+    def load_all(self, max_age=None):
+        """Returns [(guild_id, state, queue)]. Sessions older than `max_age` seconds are dropped instead."""
+        if max_age is not None:
+            cutoff = time.time() - max_age
+            with self._db:
+                self._db.execute("DELETE FROM queues WHERE guild_id IN (SELECT guild_id FROM sessions WHERE updated < ?)", (cutoff,))
+                self._db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+        rows = self._db.execute(
+            "SELECT sessions.guild_id, sessions.state, queues.tracks FROM sessions LEFT JOIN queues USING (guild_id)"
+        ).fetchall()
+        return [(guild_id, json.loads(state), json.loads(tracks) if tracks else []) for guild_id, state, tracks in rows]
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,214 @@
+import json
+import re
+import sqlite3
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+CACHE_FILE = "ytdl_cache.sqlite3"
+
+# Namespaces and how long their entries stay valid (seconds)
+LOOKUP = 'lookup' # normalized URL/query -> video id
+META = 'meta'     # video id -> static metadata (title, uploader, ...)
+STREAM = 'stream' # video id -> direct stream URL and format details
+SEARCH = 'search' # normalized search query -> list of video ids
+
+TTLS = {
+    LOOKUP: 7 * 24 * 3600,
+    META: 7 * 24 * 3600,
+    STREAM: 3 * 3600,
+    SEARCH: 6 * 3600,
+}
+QUERY_LOOKUP_TTL = TTLS[SEARCH] # Free-text results drift, unlike URL -> id mappings
+STREAM_EXPIRY_MARGIN = 3600 # Never hand out a stream URL with less than this left
+
+# Only these fields of a yt-dlp info dict are kept; everything else (formats, subtitles, ...) is dropped
+META_FIELDS = ('id', 'title', 'webpage_url', 'duration', 'uploader', 'thumbnail', 'is_live', 'extractor_key')
+STREAM_FIELDS = ('url', 'acodec', 'ext')
+
+_YT_ID_RE = re.compile(r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([A-Za-z0-9_-]{11})')
+_EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d+)')
+
+
+def normalize_key(query):
+    """Maps equivalent URLs/queries onto one cache key ('id:', 'url:' or 'q:' prefixed)."""
+    query = query.strip()
+    match = _YT_ID_RE.search(query)
+    if match:
+        return 'id:' + match.group(1)
+    if query.startswith(('http://', 'https://')):
+        parts = urlsplit(query)
+        return 'url:' + urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+    return 'q:' + ' '.join(query.lower().split())
+
+
+def trim_info(data, fields=META_FIELDS + STREAM_FIELDS):
+    return {field: data.get(field) for field in fields if data.get(field) is not None}
+
+
+def stream_expiry(stream_url):
+    match = _EXPIRE_RE.search(stream_url or '')
+    return int(match.group(1)) if match else None
+
+
+class ExtractionCache:
+    """LRU cache of yt-dlp results with per-namespace TTLs, written through to SQLite.
+    The in-memory part is capped at `max_entries`, the file at `max_disk_entries`.
+    """
+
+    def __init__(self, path=CACHE_FILE, *, max_entries=4000, max_disk_entries=50000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict() # (namespace, key) -> (expires_at, value)
+        self.hits = Counter()
+        self.misses = Counter()
+        self._writes = 0
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, expires REAL NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._prune_disk()
+
+    def get(self, namespace, key):
+        now = time.time()
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            row = self._db.execute(
+                "SELECT expires, value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], json.loads(row[1]))
+                self._remember((namespace, key), entry)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                self._forget(namespace, key)
+            self.misses[namespace] += 1
+            return None
+        self._entries.move_to_end((namespace, key))
+        self.hits[namespace] += 1
+        return entry[1]
+
+    def put(self, namespace, key, value, ttl=None):
+        ttl = TTLS[namespace] if ttl is None else ttl
+        if ttl <= 0:
+            return
+        entry = (time.time() + ttl, value)
+        self._remember((namespace, key), entry)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, expires, value) VALUES (?, ?, ?, ?)",
+                (namespace, key, entry[0], json.dumps(value, separators=(',', ':'))),
+            )
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self._prune_disk()
+
+    def _remember(self, full_key, entry):
+        self._entries[full_key] = entry
+        self._entries.move_to_end(full_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _forget(self, namespace, key):
+        self._entries.pop((namespace, key), None)
+        with self._db:
+            self._db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _prune_disk(self):
+        with self._db:
+            self._db.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+            # Over the cap: drop the rows closest to expiring
+            self._db.execute(
+                "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+
+    # --- yt-dlp specific helpers ---
+
+    def store_info(self, query, data):
+        """Caches a single extracted video under its id and under the query that produced it."""
+        video_id = data.get('id')
+        if not video_id:
+            return
+        key = normalize_key(query)
+        if key != 'id:' + video_id:
+            self.put(LOOKUP, key, video_id, ttl=QUERY_LOOKUP_TTL if key.startswith('q:') else None)
+        self.put(META, video_id, trim_info(data, META_FIELDS))
+        self._store_stream(video_id, data)
+
+    def store_meta(self, data):
+        """Caches static metadata only, e.g. for flat playlist entries that have no stream yet."""
+        if data.get('id'):
+            self.put(META, data['id'], trim_info(data, META_FIELDS))
+
+    def _store_stream(self, video_id, data):
+        stream = trim_info(data, STREAM_FIELDS)
+        if not stream.get('url'):
+            return
+        ttl = TTLS[STREAM]
+        expires = stream_expiry(stream['url'])
+        if expires is not None:
+            ttl = min(ttl, expires - time.time() - STREAM_EXPIRY_MARGIN)
+        self.put(STREAM, video_id, stream, ttl=ttl)
+
+    def lookup_id(self, query):
+        key = normalize_key(query)
+        if key.startswith('id:'):
+            return key[3:]
+        return self.get(LOOKUP, key)
+
+    def load_info(self, video_id, *, with_stream=True):
+        """Returns the cached info for a video id. With `with_stream`, a missing stream URL is a miss."""
+        meta = self.get(META, video_id)
+        if meta is None:
+            return None
+        stream = self.get(STREAM, video_id)
+        if stream is None:
+            return None if with_stream else dict(meta)
+        return {**meta, **stream}
+
+    def store_search(self, query, limit, entries):
+        ids = []
+        for entry in entries:
+            if entry and entry.get('id'):
+                self.put(META, entry['id'], trim_info(entry, META_FIELDS))
+                self._store_stream(entry['id'], entry)
+                ids.append(entry['id'])
+        self.put(SEARCH, f"{limit}:{normalize_key(query)}", ids)
+
+    def load_search(self, query, limit):
+        """Returns cached search entries. Entries whose stream URL lapsed come back without 'url'."""
+        ids = self.get(SEARCH, f"{limit}:{normalize_key(query)}")
+        if ids is None:
+            return None
+        entries = []
+        for video_id in ids:
+            info = self.load_info(video_id, with_stream=False)
+            if info is None: # Metadata evicted, the result set is incomplete
+                return None
+            entries.append(info)
+        return entries
+
+    def recent_meta(self, limit):
+        """Cached metadata of up to `limit` videos, most recently stored first (longest TTL left)."""
+        rows = self._db.execute(
+            "SELECT value FROM entries WHERE namespace = ? AND expires > ? ORDER BY expires DESC LIMIT ?",
+            (META, time.time(), limit),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'disk_entries': self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+        }
+
+    def close(self):
+        self._db.close()